@@ -1,6 +1,49 @@
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from Regex_Engine import compile_regex
+
+# 文字列リテラルとコメントを1回の走査で検出する正規表現（読み込み時に一度だけコンパイル）
+# キャプチャグループを持たないため、先頭文字 ("'/) による高速スキップが効く
+# ブロックコメント部分は最短一致版とバックトラックしない版の2種類を用意し、
+# モジュール読み込み時に _choose_pattern() で速い方を _COMMENT_RE として選ぶ
+_LITERAL_AND_LINE_COMMENT = r'''
+    "[^"\\]*(?:\\.[^"\\]*)*"    # ダブルクォート文字列
+    |                           # または
+    '[^'\\]*(?:\\.[^'\\]*)*'    # シングルクォート文字列
+    |                           # または
+    //[^\n]*                    # 行コメント
+    |                           # または
+'''
+
+_COMMENT_RE_LAZY = compile_regex(_LITERAL_AND_LINE_COMMENT + r'''
+    /\*.*?\*/                   # ブロックコメント（最短一致）
+''', re.DOTALL | re.VERBOSE)
+
+_COMMENT_RE_EAGER = compile_regex(_LITERAL_AND_LINE_COMMENT + r'''
+    /\*[^*]*\*+(?:[^/*][^*]*\*+)*/    # ブロックコメント（バックトラックなし）
+''', re.DOTALL | re.VERBOSE)
+
+# 文字列リテラルを含まないコード用の、コメントのみを検出する正規表現
+_SIMPLE_COMMENT_RE = compile_regex(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# パターン選択用の計測データ（文字列・行コメント・ブロックコメントが混在する約4KBのコード）
+_BENCHMARK_SAMPLE = (
+    'int a = 1; /* 短いコメント */ char *s = "str // not comment";\n'
+    '/*\n * 複数行の\n * ブロックコメント\n */\n'
+    "c = '\\''; x = y / z * w; // 行コメント\n"
+    '/**** 強調コメント ****/ printf("%d\\n", a);\n'
+) * 26
+
+# 連続する空行を検出する正規表現
+_BLANK_RE = re.compile(r'\n\s*\n\s*\n')
+
+# テキストモードで書き込んだ場合と同じ改行コード（バイナリモードでの出力に使用）
+_NEWLINE_BYTES = os.linesep.encode('ascii')
+
 def remove_comments_from_file(file_path):
     """
     指定されたパスのC/Hファイルからコメントを除去し、result_commentフォルダ内に出力
@@ -27,38 +70,117 @@ def remove_comments_from_file(file_path):
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
     try:
-        # ファイルを読み込み
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # ファイルを読み込み（UTF-8で読み込めない場合はcp932でデコード）
+        content, encoding = _read_source_text(input_path)
         
         # コメントを除去
         cleaned_content = remove_c_comments(content)
         
-        # 結果を出力ファイルに書き込み
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(cleaned_content)
+        # 結果をエンコード済みのバイト列として出力ファイルに書き込み
+        with open(output_path, 'wb') as f:
+            f.write(encode_output(cleaned_content))
         
-        print(f"処理完了: {input_path} -> {output_path}")
-        
-    except UnicodeDecodeError:
-        # UTF-8で読み込めない場合はcp932で試行
-        try:
-            with open(input_path, 'r', encoding='cp932') as f:
-                content = f.read()
-            
-            cleaned_content = remove_c_comments(content)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(cleaned_content)
-            
-            print(f"処理完了 (cp932): {input_path} -> {output_path}")
-            
-        except Exception as e:
-            print(f"エラー: ファイルの読み込みに失敗しました - {input_path}: {e}")
+        if encoding == 'utf-8':
+            print(f"処理完了: {input_path} -> {output_path}")
+        else:
+            print(f"処理完了 ({encoding}): {input_path} -> {output_path}")
     
     except Exception as e:
         print(f"エラー: ファイルの処理に失敗しました - {input_path}: {e}")
 
+def _read_source_text(input_path):
+    """
+    ファイルをバイト列として一度だけ読み込み、文字列にデコードする
+    
+    Args:
+        input_path: 読み込むファイルのパス (Path オブジェクト)
+    
+    Returns:
+        tuple: (content, encoding) のタプル
+            - content: 改行コードを'\n'に統一したファイル内容
+            - encoding: デコードに使用したエンコーディング ('utf-8' または 'cp932')
+    """
+    data = input_path.read_bytes()
+    try:
+        content, encoding = data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        # UTF-8で読み込めない場合はcp932で試行
+        content, encoding = data.decode('cp932'), 'cp932'
+    
+    # テキストモードでの読み込みと同様に改行コードを統一
+    return content.replace('\r\n', '\n').replace('\r', '\n'), encoding
+
+def encode_output(text):
+    """
+    出力用の文字列をUTF-8のバイト列に変換する
+    
+    改行コードはテキストモードで書き込んだ場合と同じ (os.linesep) に変換する。
+    
+    Args:
+        text: 出力する文字列（改行は'\n'）
+    
+    Returns:
+        bytes: バイナリモードでそのまま書き込めるバイト列
+    """
+    data = text.encode('utf-8')
+    if _NEWLINE_BYTES != b'\n':
+        data = data.replace(b'\n', _NEWLINE_BYTES)
+    return data
+
+def _replace_comment(match):
+    """マッチした字句を先頭文字で判別し、置換後の文字列を返す"""
+    token = match.group()
+    # 文字列リテラルの場合はそのまま返す
+    if token[0] != '/':
+        return token
+    # ブロックコメントの場合、改行を保持
+    if token[1] == '*':
+        return '\n' * token.count('\n')
+    # 行コメントの場合は空文字に置換
+    return ''
+
+def _choose_pattern():
+    """
+    コメント除去に使う正規表現を選択する
+    
+    環境変数 C_COMMENT_REGEX に lazy または eager が指定されていればそれを使い、
+    それ以外の場合は計測データで両方を実行し、速い方を返す。
+    
+    Returns:
+        コンパイル済みの正規表現 (_COMMENT_RE_LAZY または _COMMENT_RE_EAGER)
+    """
+    choice = os.environ.get('C_COMMENT_REGEX', '').strip().lower()
+    if choice == 'lazy':
+        return _COMMENT_RE_LAZY
+    if choice == 'eager':
+        return _COMMENT_RE_EAGER
+    
+    timings = []
+    for pattern in (_COMMENT_RE_LAZY, _COMMENT_RE_EAGER):
+        start = time.perf_counter_ns()
+        for _ in range(5):
+            pattern.sub(_replace_comment, _BENCHMARK_SAMPLE)
+        timings.append(time.perf_counter_ns() - start)
+    
+    return _COMMENT_RE_LAZY if timings[0] <= timings[1] else _COMMENT_RE_EAGER
+
+_COMMENT_RE = _choose_pattern()
+
+def remove_c_comments_for_parsing(code):
+    """
+    パース用のコメント除去（文字列リテラルと改行の位置は保持し、空行はまとめない）
+    
+    Args:
+        code: C/C++のソースコード文字列
+    
+    Returns:
+        コメントが除去されたソースコード文字列
+    """
+    # 引用符が1つもなければ文字列リテラルの保護は不要なため、コメントのみのパターンを使う
+    if '"' not in code and "'" not in code:
+        return _SIMPLE_COMMENT_RE.sub(_replace_comment, code)
+    return _COMMENT_RE.sub(_replace_comment, code)
+
 def remove_c_comments(code):
     """
     C/C++のコメントを除去する関数
@@ -69,63 +191,47 @@ def remove_c_comments(code):
     Returns:
         コメントが除去されたソースコード文字列
     """
-    # 文字列リテラルとコメントを正しく処理するための正規表現
-    pattern = r'''
-        (                           # グループ1: 文字列リテラル
-            "(?:[^"\\]|\\.)*"       # ダブルクォート文字列
-            |                       # または
-            '(?:[^'\\]|\\.)*'       # シングルクォート文字列
-        )
-        |                           # または
-        (                           # グループ2: コメント
-            //.*?$                  # 行コメント
-            |                       # または
-            /\*.*?\*/               # ブロックコメント
-        )
-    '''
-    
-    def replace_comment(match):
-        # 文字列リテラルの場合はそのまま返す
-        if match.group(1):
-            return match.group(1)
-        # コメントの場合
-        else:
-            comment = match.group(2)
-            # ブロックコメントの場合、改行を保持
-            if comment.startswith('/*'):
-                return '\n' * comment.count('\n')
-            # 行コメントの場合は空文字に置換
-            else:
-                return ''
-    
     # 正規表現を使ってコメントを除去
-    result = re.sub(pattern, replace_comment, code, flags=re.MULTILINE | re.DOTALL | re.VERBOSE)
+    result = remove_c_comments_for_parsing(code)
     
     # 連続する空行を1行にまとめる
-    result = re.sub(r'\n\s*\n\s*\n', '\n\n', result)
+    result = _BLANK_RE.sub('\n\n', result)
     
     return result
 
+def load_without_comments(file_path):
+    """
+    C/Hファイルを読み込み、パース用にコメントを除去した内容を返す
+    
+    Args:
+        file_path: 処理対象ファイルのパス (Path オブジェクトまたは文字列)
+    
+    Returns:
+        tuple: (content, encoding) のタプル
+            - content: コメントが除去されたソースコード文字列
+            - encoding: 元ファイルのデコードに使用したエンコーディング
+    """
+    content, encoding = _read_source_text(Path(file_path))
+    return remove_c_comments_for_parsing(content), encoding
+
 # 使用例とテスト用のコード
 if __name__ == "__main__":
     # 前回の関数も含めてテスト
     from pathlib import Path
     
-    def get_all_files():
-        """実行ファイルのフォルダ配下にある全てのファイルの相対パスを取得"""
-        script_dir = Path(__file__).parent
-        return [file.relative_to(script_dir) for file in script_dir.rglob('*') if file.is_file()]
-    
-    def filter_c_h_files(file_paths):
-        """パスのリストから.cと.hファイルのみを抽出"""
-        return [file_path for file_path in file_paths 
-                if Path(file_path).suffix.lower() in ['.c', '.h']]
-    
-    # 全ファイルを取得
-    all_files = get_all_files()
-    
-    # .cと.hファイルのみを抽出
-    c_h_files = filter_c_h_files(all_files)
+    def _walk(root):
+        """ディレクトリ配下を再帰的に走査し、.cと.hファイルのパスを順に返す"""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                # DirEntryの種別情報を使い、エントリごとのstat呼び出しを避ける
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(('.c', '.h')):
+                    yield entry.path
+    
+    # 実行ファイルのフォルダ配下にある.cと.hファイルの相対パスを取得
+    script_dir = Path(__file__).parent
+    c_h_files = [Path(path).relative_to(script_dir) for path in _walk(script_dir)]
     
     print("=== C/Hファイル一覧 ===")
     for file_path in c_h_files:
@@ -133,8 +239,9 @@ if __name__ == "__main__":
     
     # 各ファイルのコメントを除去
     print("\n=== コメント除去処理 ===")
-    for file_path in c_h_files:
-        remove_comments_from_file(file_path)
+    # ファイルごとに独立しているため、CPUコア数分のプロセスで並列に処理
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(remove_comments_from_file, c_h_files, chunksize=8))
     
     # 単一ファイルのテスト例
     # remove_comments_from_file("example.c")
\ No newline at end of file
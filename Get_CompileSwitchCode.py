@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
 import os
-import re
 import csv
 import sys
 from pathlib import Path
-from typing import List, Dict, Set, Tuple
-from itertools import product
+from typing import List, Dict, Set, Tuple, Optional
+
+from Regex_Engine import compile_regex
+
+# コンパイルスイッチを含むプリプロセッサ指令を1回で判定する正規表現
+# グループ: 1=ifdef/ifndef, 2=そのスイッチ名, 3=否定(!), 4=defined()のスイッチ名
+_PP_RE = compile_regex(
+    r'^\s*#(?:(ifdef|ifndef)\s+(\w+)|(?:if|elif)\s+(!)?defined\s*\(\s*(\w+)\s*\))'
+)
+
+# 条件コンパイル指令を種別ごとに分解する正規表現
+# グループ: 1=指令名, 2=否定(!), 3=defined()のスイッチ名, 4=指令直後の識別子
+_DIRECTIVE_RE = compile_regex(
+    r'#(ifdef|ifndef|if|elif|else|endif)\b(?:\s+(?:(!)?defined\s*\(\s*(\w+)\s*\)|(\w+)))?'
+)
 
 class CompileSwitchAnalyzer:
     def __init__(self, source_path: str):
@@ -15,52 +28,87 @@ class CompileSwitchAnalyzer:
         self.switches = set()
         self.switch_lines = []
         self.cases = []
+        self._source_lines = None  # ソースの行リスト（一度だけ読み込む）
+        self._blocks = None        # _parse_once で構築したブロック列
+        self._has_conditionals = True  # #if / #elif 指令を含むか（読み込み時に判定）
         
+    def _load_source_lines(self) -> List[str]:
+        """ソースファイルを一度だけ読み込み、行リストを返す"""
+        if self._source_lines is None:
+            content = self.source_path.read_bytes().decode('utf-8', errors='ignore')
+            # スイッチは #ifdef / #ifndef / #if / #elif にしか現れないため、ファイル全体で一度だけ確認
+            self._has_conditionals = '#if' in content or '#elif' in content
+            # テキストモードでの読み込みと同様に改行コードを統一し、行末を保持して分割
+            self._source_lines = io.StringIO(content, newline=None).readlines()
+        return self._source_lines
+    
     def extract_compile_switches(self) -> List[Dict]:
         """ソースファイルからコンパイルスイッチを抽出"""
-        switch_patterns = [
-            r'#ifdef\s+(\w+)',
-            r'#ifndef\s+(\w+)', 
-            r'#if\s+defined\s*\(\s*(\w+)\s*\)',
-            r'#if\s+!defined\s*\(\s*(\w+)\s*\)',
-            r'#elif\s+defined\s*\(\s*(\w+)\s*\)',
-            r'#elif\s+!defined\s*\(\s*(\w+)\s*\)'
-        ]
+        lines = self._load_source_lines()
         
-        with open(self.source_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
+        # 条件コンパイル指令が1つもなければ行ごとの走査を省略
+        if not self._has_conditionals:
+            return self.switch_lines
         
         for line_num, line in enumerate(lines, 1):
+            # '#'を含まない行はプリプロセッサ指令ではないため読み飛ばす
+            if '#' not in line:
+                continue
             line = line.strip()
-            for pattern in switch_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    switch_name = match.group(1)
-                    self.switches.add(switch_name)
-                    
-                    # スイッチタイプを判定
-                    if '#ifndef' in line or '!defined' in line:
-                        switch_type = 'ifndef'
-                    else:
-                        switch_type = 'ifdef'
-                    
-                    self.switch_lines.append({
-                        'line_number': line_num,
-                        'line_content': line,
-                        'switch_name': switch_name,
-                        'switch_type': switch_type
-                    })
+            match = _PP_RE.match(line)
+            if not match:
+                continue
+            
+            switch_name = match.group(2) or match.group(4)
+            self.switches.add(switch_name)
+            
+            # スイッチタイプを判定
+            if match.group(1) == 'ifndef' or match.group(3):
+                switch_type = 'ifndef'
+            else:
+                switch_type = 'ifdef'
+            
+            self.switch_lines.append({
+                'line_number': line_num,
+                'line_content': line,
+                'switch_name': switch_name,
+                'switch_type': switch_type
+            })
         
         return self.switch_lines
     
     def generate_switch_cases(self) -> List[Dict]:
-        """スイッチの組み合わせケースを生成"""
+        """
+        スイッチの組み合わせケースを生成
+        
+        条件ツリーを深さ優先でたどり、出力が変わる組み合わせだけを生成する。
+        どのガードにも影響しなくなったスイッチは分岐させず False とする。
+        """
         if not self.switches:
             return []
         
         switches_list = sorted(list(self.switches))
-        # 各スイッチに対してTrue/Falseの組み合わせを生成
-        combinations = list(product([True, False], repeat=len(switches_list)))
+        # 実際に出力ブロックに付いているガード条件だけを、出現順に重複なく対象にする
+        reachable_guards = list(dict.fromkeys(guard for guard, _ in self._parse_once() if guard))
+        combinations = []
+        
+        def dfs(assignment, pending):
+            if not pending:
+                combinations.append(tuple(assignment.get(switch, False) for switch in switches_list))
+                return
+            # 未確定のガードのうち、最初に現れる条件のスイッチで分岐（True/Falseの順）
+            switch = pending[0][0][0]
+            for enabled in (True, False):
+                remaining = []
+                for guard in pending:
+                    if (switch, not enabled) in guard:
+                        continue  # このガードは偽に確定
+                    rest = tuple(lit for lit in guard if lit[0] != switch)
+                    if rest:
+                        remaining.append(rest)
+                dfs({**assignment, switch: enabled}, remaining)
+        
+        dfs({}, reachable_guards)
         
         for i, combination in enumerate(combinations, 1):
             case_dict = {
@@ -79,12 +127,15 @@ class CompileSwitchAnalyzer:
         """スイッチが使われている行をCSVで保存"""
         csv_path = output_dir / f"{self.source_path.stem}_switch_lines.csv"
         
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            if self.switch_lines:
-                fieldnames = ['line_number', 'line_content', 'switch_name', 'switch_type']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(self.switch_lines)
+        # メモリ上でCSVを組み立て、一括でエンコードしてバイナリモードで書き込み
+        buffer = io.StringIO(newline='')
+        if self.switch_lines:
+            fieldnames = ['line_number', 'line_content', 'switch_name', 'switch_type']
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(self.switch_lines)
+        with open(csv_path, 'wb') as f:
+            f.write(buffer.getvalue().encode('utf-8'))
         
         print(f"スイッチ行情報を保存: {csv_path}")
     
@@ -92,107 +143,145 @@ class CompileSwitchAnalyzer:
         """ケース情報をCSVで保存"""
         csv_path = output_dir / f"{self.source_path.stem}_cases.csv"
         
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            if self.cases:
-                fieldnames = ['case_no', 'case_name'] + sorted(list(self.switches))
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(self.cases)
+        # メモリ上でCSVを組み立て、一括でエンコードしてバイナリモードで書き込み
+        buffer = io.StringIO(newline='')
+        if self.cases:
+            fieldnames = ['case_no', 'case_name'] + sorted(list(self.switches))
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(self.cases)
+        with open(csv_path, 'wb') as f:
+            f.write(buffer.getvalue().encode('utf-8'))
         
         print(f"ケース情報を保存: {csv_path}")
     
-    def preprocess_code(self, code_lines: List[str], case: Dict) -> List[str]:
-        """指定されたケースに基づいてコードを前処理"""
-        result = []
-        stack = []  # (condition_met, original_condition) のスタック
-        skip_depth = 0
+    def _parse_blocks(self, code_lines: List[str]) -> List[Tuple[Optional[Tuple], List[str]]]:
+        """
+        コードを一度だけ走査し、(ガード条件, 行リスト) のブロック列を構築
         
-        for line in code_lines:
-            stripped = line.strip()
-            
-            # #ifdefや#ifndefの処理
-            ifdef_match = re.match(r'#ifdef\s+(\w+)', stripped)
-            ifndef_match = re.match(r'#ifndef\s+(\w+)', stripped)
-            if_defined_match = re.match(r'#if\s+defined\s*\(\s*(\w+)\s*\)', stripped)
-            if_not_defined_match = re.match(r'#if\s+!defined\s*\(\s*(\w+)\s*\)', stripped)
-            
-            if ifdef_match or if_defined_match:
-                switch_name = ifdef_match.group(1) if ifdef_match else if_defined_match.group(1)
-                condition_met = case.get(switch_name, False)
-                stack.append((condition_met, stripped))
-                if not condition_met:
-                    skip_depth += 1
-                continue
+        ガード条件はその行が有効になるための (スイッチ名, 真偽) の組のタプルで、
+        全ての組が成り立つ場合にのみ行が出力される。None は常に無効な行を表す。
+        defined() 以外の条件式を持つ #if は解釈せず、指令行ごとそのまま残す。
+        """
+        blocks = []
+        # スタックの要素: [親のガード, 先行する分岐の否定条件, 未解釈の#ifか]
+        stack = []
+        guard = ()
+        
+        def emit(lines):
+            if guard is None or not lines:
+                return
+            if blocks and blocks[-1][0] == guard:
+                blocks[-1][1].extend(lines)
+            else:
+                blocks.append((guard, list(lines)))
+        
+        # '#'で始まる行の位置を先に求め、その間の通常行はスライスでまとめて出力する
+        directive_indices = [
+            i for i, line in enumerate(code_lines)
+            if '#' in line and line.lstrip().startswith('#')
+        ]
+        
+        prev = 0
+        for index in directive_indices:
+            emit(code_lines[prev:index])
+            prev = index + 1
+            line = code_lines[index]
             
-            elif ifndef_match or if_not_defined_match:
-                switch_name = ifndef_match.group(1) if ifndef_match else if_not_defined_match.group(1)
-                condition_met = not case.get(switch_name, False)
-                stack.append((condition_met, stripped))
-                if not condition_met:
-                    skip_depth += 1
+            match = _DIRECTIVE_RE.match(line.strip())
+            if not match:
+                emit([line])
                 continue
+            directive, negated, defined_name, word = match.groups()
             
-            elif stripped.startswith('#else'):
-                if stack:
-                    prev_condition, _ = stack[-1]
-                    new_condition = not prev_condition
-                    stack[-1] = (new_condition, stack[-1][1])
-                    if prev_condition and not new_condition:
-                        skip_depth += 1
-                    elif not prev_condition and new_condition:
-                        skip_depth -= 1
-                continue
+            if directive == 'ifdef' or directive == 'ifndef' or directive == 'if':
+                # #ifdef / #ifndef / #if [!]defined() の処理
+                if directive == 'if':
+                    switch_name, polarity = defined_name, not negated
+                else:
+                    switch_name, polarity = word, directive == 'ifdef'
+                
+                if switch_name is None:
+                    # defined() 以外の条件式は解釈せず、グループ全体をそのまま残す
+                    stack.append([guard, (), True])
+                    emit([line])
+                    continue
+                
+                stack.append([guard, ((switch_name, not polarity),), False])
+                if guard is not None:
+                    guard = guard + ((switch_name, polarity),)
             
-            elif stripped.startswith('#elif'):
+            elif directive == 'elif':
                 # 簡単な#elif defined処理
-                elif_defined_match = re.match(r'#elif\s+defined\s*\(\s*(\w+)\s*\)', stripped)
-                elif_not_defined_match = re.match(r'#elif\s+!defined\s*\(\s*(\w+)\s*\)', stripped)
-                
                 if stack:
-                    prev_condition, _ = stack[-1]
-                    if prev_condition:
-                        # 前の条件が真だった場合、elifは評価されない
-                        new_condition = False
-                        if not new_condition:
-                            skip_depth += 1
+                    parent_guard, prior, passthrough = stack[-1]
+                    if passthrough:
+                        emit([line])
+                    elif defined_name is None:
+                        # 解釈できない条件は偽として扱う
+                        guard = None
                     else:
-                        # 前の条件が偽だった場合、elifを評価
-                        if elif_defined_match:
-                            switch_name = elif_defined_match.group(1)
-                            new_condition = case.get(switch_name, False)
-                        elif elif_not_defined_match:
-                            switch_name = elif_not_defined_match.group(1)
-                            new_condition = not case.get(switch_name, False)
-                        else:
-                            new_condition = False
-                        
-                        if not new_condition:
-                            skip_depth += 1
-                        else:
-                            skip_depth -= 1
-                    
-                    stack[-1] = (new_condition, stripped)
-                continue
+                        polarity = not negated
+                        if parent_guard is not None:
+                            guard = parent_guard + prior + ((defined_name, polarity),)
+                        stack[-1][1] = prior + ((defined_name, not polarity),)
             
-            elif stripped.startswith('#endif'):
+            elif directive == 'else':
                 if stack:
-                    prev_condition, _ = stack.pop()
-                    if not prev_condition and skip_depth > 0:
-                        skip_depth -= 1
-                continue
+                    parent_guard, prior, passthrough = stack[-1]
+                    if passthrough:
+                        emit([line])
+                    elif parent_guard is not None:
+                        guard = parent_guard + prior
             
-            # 通常の行の処理
-            if skip_depth == 0:
-                result.append(line)
+            else:  # endif
+                if stack:
+                    parent_guard, _, passthrough = stack.pop()
+                    guard = parent_guard
+                    if passthrough:
+                        emit([line])
+        
+        emit(code_lines[prev:])
         
+        return blocks
+    
+    def _parse_once(self) -> List[Tuple[Tuple, bytes]]:
+        """
+        ソースファイルのブロック列を一度だけ構築して返す
+        
+        各ブロックの行は連結してUTF-8にエンコード済みのため、ケースごとの
+        出力では再エンコードせずにそのまま書き込める。
+        改行コードはテキストモードで書き込んだ場合と同じ (os.linesep) にしておく。
+        （出力はバイナリモードの fd に書き込むため、改行の変換はここでの1回のみ）
+        """
+        if self._blocks is None:
+            self._blocks = [
+                (guard, ''.join(block_lines).replace('\n', os.linesep).encode('utf-8'))
+                for guard, block_lines in self._parse_blocks(self._load_source_lines())
+            ]
+        return self._blocks
+    
+    @staticmethod
+    def _guard_holds(guard: Tuple, case: Dict) -> bool:
+        """ガード条件がケースの下で成り立つか判定"""
+        return all(case.get(switch_name, False) == polarity for switch_name, polarity in guard)
+    
+    def preprocess_code(self, code_lines: List[str], case: Dict) -> List[str]:
+        """指定されたケースに基づいてコードを前処理"""
+        result = []
+        for guard, block_lines in self._parse_blocks(code_lines):
+            if self._guard_holds(guard, case):
+                result.extend(block_lines)
         return result
     
     def extract_case_code(self, case: Dict, output_dir: Path):
         """指定されたケースで有効なコードを抽出して保存"""
-        with open(self.source_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        
-        processed_lines = self.preprocess_code(lines, case)
+        output_path = self._write_case_code(case, output_dir)
+        print(f"ケース {case['case_no']} のコードを保存: {output_path}")
+    
+    def _write_case_code(self, case: Dict, output_dir: Path) -> Path:
+        """指定されたケースで有効なコードを抽出して保存し、出力先のパスを返す"""
+        data = b''.join(chunk for guard, chunk in self._parse_once() if self._guard_holds(guard, case))
         
         # 出力ファイル名を生成
         case_no = case['case_no']
@@ -200,10 +289,17 @@ class CompileSwitchAnalyzer:
         output_filename = f"sw_case_{case_no:02d}_{self.source_path.stem}{file_extension}"
         output_path = output_dir / output_filename
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.writelines(processed_lines)
+        # エンコード済みのバイト列を1回の書き込みで出力
+        # （Windowsで改行が二重に変換されないよう、バイナリモード (O_BINARY) で開く）
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
         
-        print(f"ケース {case_no} のコードを保存: {output_path}")
+        return output_path
     
     def analyze(self, output_dir: str = None):
         """メイン解析処理"""
@@ -236,8 +332,12 @@ class CompileSwitchAnalyzer:
         
         # 各ケースのコードを抽出
         print("\nケース別コード抽出中...")
-        for case in cases:
-            self.extract_case_code(case, output_dir)
+        # ケースごとの保存メッセージはまとめておき、最後に一度だけ出力する
+        log_lines = [
+            f"ケース {case['case_no']} のコードを保存: {self._write_case_code(case, output_dir)}\n"
+            for case in cases
+        ]
+        sys.stdout.write(''.join(log_lines))
         
         print(f"\n解析完了! 出力ディレクトリ: {output_dir}")
 
@@ -1,6 +1,24 @@
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from Delete_Comment import encode_output, load_without_comments, remove_c_comments_for_parsing
+from Regex_Engine import compile_regex
+
+# #define行を行継続文字(\)による継続行ごと検出する正規表現（読み込み時に一度だけコンパイル）
+# 末尾が '\'（後続の空白は無視）の行が続く限り、次の行までを1つの定義として扱う
+# RE2でも使えるよう先読みは使わず、継続行の有無で選択肢を分けている
+_DEFINE_RE = compile_regex(
+    r'^[^\S\n]*#define[^\S\n]+'
+    r'(?:(?:\\|\S[^\n]*\\)[^\S\n]*\n(?:[^\n]*\\[^\S\n]*\n)*[^\n]*'   # 継続行あり
+    r'|\S[^\n]*)',                                                  # 1行のみ
+    re.MULTILINE
+)
+
+# 引数を持つマクロ定義 (#define NAME(params)) を判定する正規表現
+_MACRO_RE = compile_regex(r'^\s*#define\s+([A-Za-z_][A-Za-z0-9_]*)\s*\(')
+
 def extract_defines_from_file(file_path):
     """
     指定されたパスのC/Hファイルからdefine定義とdefineマクロを抽出し、それぞれ別のフォルダに出力
@@ -30,70 +48,36 @@ def extract_defines_from_file(file_path):
     macro_output_path.parent.mkdir(parents=True, exist_ok=True)
     
     try:
-        # ファイルを読み込み
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # ファイルを読み込み、コメントを除去（UTF-8で読み込めない場合はcp932でデコード）
+        content, encoding = load_without_comments(input_path)
         
         # define定義とマクロを抽出
-        define_definitions, define_macros = extract_defines(content)
+        define_definitions, define_macros = extract_defines_without_comments(content)
         
-        # define定義を出力
-        with open(define_output_path, 'w', encoding='utf-8') as f:
-            f.write(f"// Define definitions extracted from {input_path}\n")
-            f.write("// " + "="*60 + "\n\n")
-            if define_definitions:
-                for define in define_definitions:
-                    f.write(define + "\n")
-            else:
-                f.write("// No define definitions found\n")
+        # define定義を出力（内容を組み立ててから一括でエンコードして書き込み）
+        define_text = [f"// Define definitions extracted from {input_path}\n", "// " + "="*60 + "\n\n"]
+        if define_definitions:
+            define_text.extend(define + "\n" for define in define_definitions)
+        else:
+            define_text.append("// No define definitions found\n")
+        with open(define_output_path, 'wb') as f:
+            f.write(encode_output(''.join(define_text)))
         
         # defineマクロを出力
-        with open(macro_output_path, 'w', encoding='utf-8') as f:
-            f.write(f"// Define macros extracted from {input_path}\n")
-            f.write("// " + "="*60 + "\n\n")
-            if define_macros:
-                for macro in define_macros:
-                    f.write(macro + "\n")
-            else:
-                f.write("// No define macros found\n")
+        macro_text = [f"// Define macros extracted from {input_path}\n", "// " + "="*60 + "\n\n"]
+        if define_macros:
+            macro_text.extend(macro + "\n" for macro in define_macros)
+        else:
+            macro_text.append("// No define macros found\n")
+        with open(macro_output_path, 'wb') as f:
+            f.write(encode_output(''.join(macro_text)))
         
-        print(f"処理完了: {input_path}")
+        if encoding == 'utf-8':
+            print(f"処理完了: {input_path}")
+        else:
+            print(f"処理完了 ({encoding}): {input_path}")
         print(f"  Define定義: {len(define_definitions)}個 -> {define_output_path}")
         print(f"  Defineマクロ: {len(define_macros)}個 -> {macro_output_path}")
-        
-    except UnicodeDecodeError:
-        # UTF-8で読み込めない場合はcp932で試行
-        try:
-            with open(input_path, 'r', encoding='cp932') as f:
-                content = f.read()
-            
-            define_definitions, define_macros = extract_defines(content)
-            
-            # 出力処理（上記と同じ）
-            with open(define_output_path, 'w', encoding='utf-8') as f:
-                f.write(f"// Define definitions extracted from {input_path}\n")
-                f.write("// " + "="*60 + "\n\n")
-                if define_definitions:
-                    for define in define_definitions:
-                        f.write(define + "\n")
-                else:
-                    f.write("// No define definitions found\n")
-            
-            with open(macro_output_path, 'w', encoding='utf-8') as f:
-                f.write(f"// Define macros extracted from {input_path}\n")
-                f.write("// " + "="*60 + "\n\n")
-                if define_macros:
-                    for macro in define_macros:
-                        f.write(macro + "\n")
-                else:
-                    f.write("// No define macros found\n")
-            
-            print(f"処理完了 (cp932): {input_path}")
-            print(f"  Define定義: {len(define_definitions)}個 -> {define_output_path}")
-            print(f"  Defineマクロ: {len(define_macros)}個 -> {macro_output_path}")
-            
-        except Exception as e:
-            print(f"エラー: ファイルの読み込みに失敗しました - {input_path}: {e}")
     
     except Exception as e:
         print(f"エラー: ファイルの処理に失敗しました - {input_path}: {e}")
@@ -111,33 +95,20 @@ def extract_defines(code):
             - define_macros: 引数を持つマクロ定義のリスト
     """
     # まずコメントを除去（文字列リテラルは保護）
-    code_without_comments = remove_c_comments_for_parsing(code)
-    
-    # #defineを含む行を抽出（複数行対応・改良版）
-    # 行継続文字(\)を考慮した正規表現
-    define_pattern = r'^\s*#define\s+[A-Za-z_][A-Za-z0-9_]*(?:\([^)]*\))?\s*(?:\\(?:\r?\n|$)|[^\r\n\\])*(?:\\(?:\r?\n[^\r\n]*)*[^\r\n\\]*)?'
+    return extract_defines_without_comments(remove_c_comments_for_parsing(code))
+
+def extract_defines_without_comments(code_without_comments):
+    """
+    コメント除去済みのソースコードからdefine定義とdefineマクロを抽出する
     
-    # より確実な方法：行単位で処理
-    lines = code_without_comments.split('\n')
-    defines = []
-    i = 0
+    Args:
+        code_without_comments: コメントを除去したC/C++のソースコード文字列
     
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # #defineで始まる行を検出
-        if re.match(r'^\s*#define\s+', line):
-            define_block = lines[i]
-            
-            # 継続行がある場合の処理
-            while line.rstrip().endswith('\\') and i + 1 < len(lines):
-                i += 1
-                define_block += '\n' + lines[i]
-                line = lines[i].strip()
-            
-            defines.append(define_block)
-        
-        i += 1
+    Returns:
+        tuple: (define_definitions, define_macros) のタプル
+    """
+    # #define行を継続行ごと一括で抽出
+    defines = _DEFINE_RE.findall(code_without_comments)
     
     define_definitions = []
     define_macros = []
@@ -148,8 +119,7 @@ def extract_defines(code):
         
         # マクロかどうかを判定（括弧があるかどうか）
         # #define NAME(params) の形式かチェック
-        macro_pattern = r'^\s*#define\s+([A-Za-z_][A-Za-z0-9_]*)\s*\('
-        if re.match(macro_pattern, normalized_define):
+        if _MACRO_RE.match(normalized_define):
             define_macros.append(normalized_define)
         else:
             define_definitions.append(normalized_define)
@@ -182,75 +152,31 @@ def normalize_define(define_text):
     
     # 複数行の場合は適切にフォーマット
     if len(normalized_lines) > 1:
-        # 最初の行（#define部分）
-        result = normalized_lines[0]
-        
-        # 継続行がある場合
-        if len(normalized_lines) > 1:
-            result += ' \\\n'
-            for i in range(1, len(normalized_lines)):
-                line = normalized_lines[i].strip()
-                if i == len(normalized_lines) - 1:
-                    # 最後の行には継続文字を付けない
-                    result += '    ' + line
-                else:
-                    # 中間行には継続文字を付ける
-                    result += '    ' + line + ' \\\n'
-        
-        return result
+        # 最初の行（#define部分）に続けて、継続行をインデントして継続文字で連結
+        # （最後の行には継続文字を付けない）
+        return ' \\\n'.join(
+            [normalized_lines[0]] + ['    ' + line.strip() for line in normalized_lines[1:]]
+        )
     else:
         return normalized_lines[0] if normalized_lines else define_text
 
-def remove_c_comments_for_parsing(code):
-    """
-    パース用のコメント除去（簡易版）
-    """
-    # 文字列リテラルとコメントを処理
-    pattern = r'''
-        (                           # グループ1: 文字列リテラル
-            "(?:[^"\\]|\\.)*"       # ダブルクォート文字列
-            |                       # または
-            '(?:[^'\\]|\\.)*'       # シングルクォート文字列
-        )
-        |                           # または
-        (                           # グループ2: コメント
-            //.*?$                  # 行コメント
-            |                       # または
-            /\*.*?\*/               # ブロックコメント
-        )
-    '''
-    
-    def replace_comment(match):
-        if match.group(1):
-            return match.group(1)
-        else:
-            comment = match.group(2)
-            if comment.startswith('/*'):
-                return '\n' * comment.count('\n')
-            else:
-                return ''
-    
-    return re.sub(pattern, replace_comment, code, flags=re.MULTILINE | re.DOTALL | re.VERBOSE)
-
 # 使用例とテスト用のコード
 if __name__ == "__main__":
     from pathlib import Path
     
-    def get_all_files():
-        """実行ファイルのフォルダ配下にある全てのファイルの相対パスを取得"""
-        script_dir = Path(__file__).parent
-        return [file.relative_to(script_dir) for file in script_dir.rglob('*') if file.is_file()]
-    
-    def filter_c_h_files(file_paths):
-        """パスのリストから.cと.hファイルのみを抽出"""
-        return [file_path for file_path in file_paths 
-                if Path(file_path).suffix.lower() in ['.c', '.h']]
-    
-    # 全ファイルを取得
-    all_files = get_all_files()
-    
-    # .cと.hファイルのみを抽出
-    c_h_files = filter_c_h_files(all_files)
+    def _walk(root):
+        """ディレクトリ配下を再帰的に走査し、.cと.hファイルのパスを順に返す"""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                # DirEntryの種別情報を使い、エントリごとのstat呼び出しを避ける
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(('.c', '.h')):
+                    yield entry.path
+    
+    # 実行ファイルのフォルダ配下にある.cと.hファイルの相対パスを取得
+    script_dir = Path(__file__).parent
+    c_h_files = [Path(path).relative_to(script_dir) for path in _walk(script_dir)]
     
     print("=== C/Hファイル一覧 ===")
     for file_path in c_h_files:
@@ -258,8 +184,9 @@ if __name__ == "__main__":
     
     # 各ファイルからdefine定義とマクロを抽出
     print("\n=== Define抽出処理 ===")
-    for file_path in c_h_files:
-        extract_defines_from_file(file_path)
+    # ファイルごとに独立しているため、CPUコア数分のプロセスで並列に処理
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(extract_defines_from_file, c_h_files, chunksize=8))
     
     # 単一ファイルのテスト例
     # extract_defines_from_file("example.h")
@@ -1,6 +1,35 @@
+import io
 import re
 import csv
 import os
+from pathlib import Path
+
+from Regex_Engine import compile_regex
+
+# 文字列リテラルとコメントを除去するための正規表現（読み込み時に一度だけコンパイル）
+# どれも空白1文字に置換するため、グループを持たない単一パターンにしている
+_STRIP_RE = compile_regex(r'"(?:[^"\\]|\\.)*"|/\*.*?\*/|//[^\n]*|\'(?:[^\'\\]|\\.)*\'', re.DOTALL)
+
+# 文字列リテラルを含まないコード用の、コメントのみを検出する正規表現
+_SIMPLE_COMMENT_RE = compile_regex(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+
+# 関数定義の正規表現パターン
+# 戻り値の型、関数名、引数、関数本体の開始 '{' を抽出
+_FUNC_DEF_RE = compile_regex(r'([a-zA-Z_][a-zA-Z0-9_]*\s+)*([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*\{')
+
+# 関数呼び出しの正規表現パターン
+# 関数名(引数) の形式
+_FUNC_CALL_RE = compile_regex(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\(')
+
+# 関数呼び出しとして扱わないC言語のキーワードや制御構文
+_C_KEYWORDS = frozenset({
+    'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default',
+    'return', 'break', 'continue', 'goto', 'sizeof', 'typeof',
+    'static_assert', '_Static_assert'
+})
+
+# 波括弧を検出する正規表現
+_BRACE_RE = compile_regex(r'[{}]')
 
 def extract_function_calls(file_path, output_csv_path="function_calls.csv"):
     """
@@ -12,21 +41,24 @@ def extract_function_calls(file_path, output_csv_path="function_calls.csv"):
     """
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        # ファイルをバイト列として一度だけ読み込む
+        data = Path(file_path).read_bytes()
+    except FileNotFoundError:
+        print(f"エラー: ファイル {file_path} が見つかりません")
+        return
+    
+    try:
+        content = data.decode('utf-8')
     except UnicodeDecodeError:
         # UTF-8で読めない場合はShift-JISを試す
         try:
-            with open(file_path, 'r', encoding='shift-jis') as file:
-                content = file.read()
+            content = data.decode('shift-jis')
         except UnicodeDecodeError:
             print(f"エラー: ファイル {file_path} の文字エンコーディングを読み取れません")
             return
-    except FileNotFoundError:
-        print(f"エラー: ファイル {file_path} が見つかりません")
-        return
     
-    # コメントと文字列リテラルを除去
+    # コメントと文字列リテラルを空白に置換して除去
+    # （コメントで区切られた識別子同士が連結されないよう、共通のコメント除去は使わない）
     content = remove_comments_and_strings(content)
     
     # 関数定義を抽出
@@ -43,10 +75,13 @@ def extract_function_calls(file_path, output_csv_path="function_calls.csv"):
     
     # CSVファイルに出力
     try:
-        with open(output_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['呼び出し元', '呼び出し先'])  # ヘッダー
-            writer.writerows(function_calls)
+        # メモリ上でCSVを組み立て、一括でエンコードしてバイナリモードで書き込み
+        buffer = io.StringIO(newline='')
+        writer = csv.writer(buffer)
+        writer.writerow(['呼び出し元', '呼び出し先'])  # ヘッダー
+        writer.writerows(function_calls)
+        with open(output_csv_path, 'wb') as csvfile:
+            csvfile.write(buffer.getvalue().encode('utf-8'))
         
         print(f"関数呼び出し関係を {output_csv_path} に出力しました")
         print(f"抽出された関数呼び出し数: {len(function_calls)}")
@@ -66,17 +101,11 @@ def remove_comments_and_strings(content):
     """
     C言語コードからコメントと文字列リテラルを除去
     """
-    # 文字列リテラルとコメントを除去するための正規表現
-    pattern = r'("(?:[^"\\]|\\.)*")|(/\*.*?\*/)|(//.*)|(\'(?:[^\'\\]|\\.)*\')'
-    
-    def replace_func(match):
-        if match.group(2) or match.group(3):  # コメント
-            return ' '
-        elif match.group(1) or match.group(4):  # 文字列リテラル
-            return ' '
-        return match.group(0)
-    
-    return re.sub(pattern, replace_func, content, flags=re.DOTALL)
+    # 引用符が1つもなければ文字列リテラルの検出は不要なため、コメントのみのパターンを使う
+    if '"' not in content and "'" not in content:
+        return _SIMPLE_COMMENT_RE.sub(' ', content)
+    # コメント・文字列リテラルはいずれも空白1文字に置換
+    return _STRIP_RE.sub(' ', content)
 
 def extract_function_definitions(content):
     """
@@ -85,59 +114,43 @@ def extract_function_definitions(content):
     """
     function_definitions = {}
     
-    # 関数定義の正規表現パターン
-    # 戻り値の型、関数名、引数、関数本体を抽出
-    pattern = r'([a-zA-Z_][a-zA-Z0-9_]*\s+)*([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*\{'
-    
-    matches = list(re.finditer(pattern, content))
+    # 各 '{' に対応する '}' の位置を一度の走査で求めておく
+    brace_pairs = match_braces(content)
     
-    for match in matches:
+    for match in _FUNC_DEF_RE.finditer(content):
         func_name = match.group(2)
         start_pos = match.end() - 1  # '{' の位置
         
-        # 対応する '}' を見つける
-        brace_count = 1
-        pos = start_pos + 1
-        
-        while pos < len(content) and brace_count > 0:
-            if content[pos] == '{':
-                brace_count += 1
-            elif content[pos] == '}':
-                brace_count -= 1
-            pos += 1
-        
-        if brace_count == 0:
-            func_body = content[start_pos:pos]
+        # 対応する '}' がある場合のみ関数本体とする
+        end_pos = brace_pairs.get(start_pos)
+        if end_pos is not None:
+            func_body = content[start_pos:end_pos + 1]
             function_definitions[func_name] = func_body
     
     return function_definitions
 
-def extract_called_functions(func_body):
+def match_braces(content):
     """
-    関数本体から呼び出されている関数を抽出
+    コード全体を一度だけ走査し、'{' の位置から対応する '}' の位置への辞書を作成
+    戻り値: {'{'の位置: 対応する'}'の位置} の辞書（閉じていない '{' は含まない）
     """
-    called_functions = set()
+    brace_pairs = {}
+    open_positions = []
     
-    # 関数呼び出しの正規表現パターン
-    # 関数名(引数) の形式
-    pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
+    for match in _BRACE_RE.finditer(content):
+        if match.group() == '{':
+            open_positions.append(match.start())
+        elif open_positions:
+            brace_pairs[open_positions.pop()] = match.start()
     
-    matches = re.finditer(pattern, func_body)
-    
-    for match in matches:
-        func_name = match.group(1)
-        
-        # C言語のキーワードや制御構文を除外
-        keywords = {
-            'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default',
-            'return', 'break', 'continue', 'goto', 'sizeof', 'typeof',
-            'static_assert', '_Static_assert'
-        }
-        
-        if func_name not in keywords:
-            called_functions.add(func_name)
-    
-    return called_functions
+    return brace_pairs
+
+def extract_called_functions(func_body):
+    """
+    関数本体から呼び出されている関数を抽出
+    """
+    # 呼び出し名を一括で取得し、C言語のキーワードや制御構文を集合演算で除外
+    return frozenset(_FUNC_CALL_RE.findall(func_body)) - _C_KEYWORDS
 
 def main():
     """
@@ -2,8 +2,88 @@ import re
 import os
 import csv
 import sys
+import mmap
+import bisect
+import argparse
+import codecs
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# 数値パターンの正規表現（読み込み時に一度だけコンパイル）
+# 整数: 10進数、16進数(0x, 0X)、8進数(0で始まる)、2進数(0b, 0B)
+# 浮動小数点数: 1.23, .5, 1., 1e10, 1.23e-4 など
+# サフィックス: L, LL, U, UL, ULL, f, F, l, L など
+# 全パターンを先頭文字（数字か小数点か）ごとにまとめた1つの選択肢にし、同じ位置では
+# 上から順に最初に一致したものを採用する。先頭の先読み (?=[\d.]) により、数値で始まらない
+# 位置は正規表現エンジン内の文字集合の検索で読み飛ばされる。
+# UTF-8のバイト列に直接適用するため、前後が識別子の一部（英数字・アンダースコア・
+# 非ASCII文字）や小数点でないことは先読み・後読みで確認する
+_NUMBER_RE = re.compile(
+    rb'(?=[\d.])(?<![\w.\x80-\xff])(?:'
+    rb'0[xX][0-9a-fA-F]+[uUlL]*'            # 16進数 (0x, 0X)
+    rb'|0[bB][01]+[uUlL]*'                  # 2進数 (0b, 0B) - C23またはGCC拡張
+    rb'|\d+(?:\.\d*)?[eE][+-]?\d+[fFlL]?'    # 浮動小数点数（指数表記あり）
+    rb'|\d+\.\d*[fFlL]?'                     # 浮動小数点数（指数表記なし）
+    rb'|0[0-7]*[uUlL]*'                     # 8進数 (0で始まる) と0単体
+    rb'|[1-9]\d*[uUlL]*'                    # 10進数（整数）
+    rb'|\.\d+(?:[eE][+-]?\d+)?[fFlL]?'       # 小数点で始まる浮動小数点数
+    rb')(?![\w.\x80-\xff])'
+)
+
+# コメントと文字列リテラル内の数値は除外するためのパターン
+# ファイル全体に適用するため、文字列・文字リテラルは改行をまたがないようにする
+# 最短一致（.*?）は1文字ごとに終端の照合を試みるため、否定文字クラスの繰り返しで
+# 終端まで一気に読み進める形（ループ展開）にしている
+_COMMENT_STRING_RE = re.compile(
+    rb'//[^\n]*|'                               # 行コメント
+    rb'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|'          # ブロックコメント
+    rb'"[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"|'       # 文字列リテラル
+    rb"'[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'"        # 文字リテラル
+)
+
+# 行番号を求めるための改行パターン
+_NEWLINE_RE = re.compile(rb'\n')
+
+def _is_utf8(data, chunk_size=1 << 20):
+    """バイト列がUTF-8として正しいかを、一定サイズずつデコードして確認"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(data), chunk_size):
+            decoder.decode(data[start:start + chunk_size])
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def _open_utf8_source(file_path):
+    """
+    ソースファイルをUTF-8のバイト列として開く
+    
+    UTF-8のファイルはメモリマップをそのまま返し、ファイル全体のデコードやコピーを行わない。
+    Shift_JISのファイルはUTF-8に変換したバイト列を返す。
+    
+    Args:
+        file_path (str): C言語ソースファイルのパス
+    
+    Returns:
+        mmap または bytes。どちらのエンコーディングでも読めない場合は None
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    if _is_utf8(mapped):
+        return mapped
+    
+    try:
+        # UTF-8で読めない場合はShift_JISを試す
+        return mapped[:].decode('shift_jis').encode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    finally:
+        mapped.close()
+
 def extract_magic_numbers(file_path):
     """
     C言語ソースファイルからマジックナンバーを抽出する
@@ -12,87 +92,55 @@ def extract_magic_numbers(file_path):
         file_path (str): C言語ソースファイルのパス
     
     Returns:
-        list: マジックナンバーの情報を含む辞書のリスト
+        list: マジックナンバーの情報 (行番号, 列番号, 数値, 行の内容) のタプルのリスト
     """
     magic_numbers = []
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-    except UnicodeDecodeError:
-        # UTF-8で読めない場合はShift_JISを試す
-        try:
-            with open(file_path, 'r', encoding='shift_jis') as file:
-                lines = file.readlines()
-        except UnicodeDecodeError:
-            # それでも読めない場合はエラーを出力して空のリストを返す
-            print(f"Warning: Could not read file {file_path} with UTF-8 or Shift_JIS encoding")
-            return []
-    
-    # 数値パターンの正規表現
-    # 整数: 10進数、16進数(0x, 0X)、8進数(0で始まる)、2進数(0b, 0B)
-    # 浮動小数点数: 1.23, .5, 1., 1e10, 1.23e-4 など
-    # サフィックス: L, LL, U, UL, ULL, f, F, l, L など
-    number_patterns = [
-        # 16進数 (0x, 0X)
-        r'\b0[xX][0-9a-fA-F]+[uUlL]*\b',
-        # 2進数 (0b, 0B) - C23またはGCC拡張
-        r'\b0[bB][01]+[uUlL]*\b',
-        # 8進数 (0で始まる)
-        r'\b0[0-7]+[uUlL]*\b',
-        # 浮動小数点数（指数表記あり）
-        r'\b\d+\.?\d*[eE][+-]?\d+[fFlL]?\b',
-        r'\b\.\d+[eE][+-]?\d+[fFlL]?\b',
-        # 浮動小数点数（指数表記なし）
-        r'\b\d+\.\d+[fFlL]?\b',
-        r'\b\d+\.[fFlL]?\b',
-        r'\b\.\d+[fFlL]?\b',
-        # 10進数（整数）
-        r'\b[1-9]\d*[uUlL]*\b',
-        # 0単体
-        r'\b0[uUlL]*\b'
-    ]
-    
-    # コメントと文字列リテラル内の数値は除外するためのパターン
-    comment_string_pattern = re.compile(
-        r'//.*?$|'           # 行コメント
-        r'/\*.*?\*/|'        # ブロックコメント
-        r'"(?:[^"\\]|\\.)*"|'  # 文字列リテラル
-        r"'(?:[^'\\]|\\.)*'",  # 文字リテラル
-        re.MULTILINE | re.DOTALL
-    )
+    content = _open_utf8_source(file_path)
+    if content is None:
+        # それでも読めない場合はエラーを出力して空のリストを返す
+        print(f"Warning: Could not read file {file_path} with UTF-8 or Shift_JIS encoding")
+        return []
     
-    for line_num, line in enumerate(lines, 1):
-        # コメントと文字列を除外したラインを作成
-        clean_line = line
-        for match in comment_string_pattern.finditer(line):
-            # マッチした部分を同じ長さの空白で置換（行位置を保持）
-            clean_line = clean_line[:match.start()] + ' ' * (match.end() - match.start()) + clean_line[match.end():]
+    try:
+        # ファイル全体を1回走査し、コメントと文字列の範囲 [開始, 終了) を記録
+        excluded_starts = []
+        excluded_ends = []
+        for match in _COMMENT_STRING_RE.finditer(content):
+            excluded_starts.append(match.start())
+            excluded_ends.append(match.end())
         
-        # 各数値パターンをチェック
-        for pattern in number_patterns:
-            for match in re.finditer(pattern, clean_line):
-                number = match.group()
-                column = match.start() + 1  # 1から始まる列番号
-                
-                # 前後の文字をチェックして識別子の一部でないことを確認
-                start_pos = match.start()
-                end_pos = match.end()
-                
-                # 前の文字が英数字またはアンダースコアでないことを確認
-                if start_pos > 0 and clean_line[start_pos - 1].isalnum() or (start_pos > 0 and clean_line[start_pos - 1] == '_'):
-                    continue
-                
-                # 後の文字が英数字またはアンダースコアでないことを確認
-                if end_pos < len(clean_line) and (clean_line[end_pos].isalnum() or clean_line[end_pos] == '_'):
-                    continue
-                
-                magic_numbers.append({
-                    'line': line_num,
-                    'column': column,
-                    'number': number,
-                    'context': line.strip()
-                })
+        # 現在の行の番号と範囲（行の一覧は作らず、数値が見つかった位置から求める）
+        line_num = 1
+        line_start = 0
+        line_end = -1
+        for match in _NUMBER_RE.finditer(content):
+            start = match.start()
+            
+            # コメントや文字列の範囲内にある数値は除外
+            i = bisect.bisect_right(excluded_starts, start) - 1
+            if i >= 0 and start < excluded_ends[i]:
+                continue
+            
+            # 行が変わったときだけ、前の行の先頭からの改行を数えてその行をデコード
+            if start > line_end:
+                line_num += len(_NEWLINE_RE.findall(content, line_start, start))
+                line_start = content.rfind(b'\n', 0, start) + 1
+                line_end = content.find(b'\n', start)
+                if line_end == -1:
+                    line_end = len(content)
+                line = content[line_start:line_end]
+                context = line.decode('utf-8').strip()
+                is_ascii = line.isascii()
+            
+            # 列番号は文字単位（1から始まる）
+            offset = start - line_start
+            column = offset + 1 if is_ascii else len(line[:offset].decode('utf-8')) + 1
+            
+            magic_numbers.append((line_num, column, match.group().decode('ascii'), context))
+    finally:
+        if isinstance(content, mmap.mmap):
+            content.close()
     
     return magic_numbers
 
@@ -133,37 +181,41 @@ def save_to_csv(magic_numbers, output_path):
         output_path (str): 出力ファイルのパス
     """
     with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['line', 'column', 'number', 'context']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.writer(csvfile)
         
-        writer.writeheader()
-        for item in magic_numbers:
-            writer.writerow(item)
+        writer.writerow(['line', 'column', 'number', 'context'])
+        writer.writerows(magic_numbers)
 
-def main():
-    """
-    メイン関数
+def process_file(file_path, relative_path=None):
     """
-    if len(sys.argv) != 2:
-        print("Usage: python magic_number_extractor.py <relative_path_to_c_file>")
-        sys.exit(1)
-    
-    relative_path = sys.argv[1]
+    1ファイルからマジックナンバーを抽出し、結果をCSVファイルに保存する
     
-    # ファイルの存在確認
-    if not os.path.exists(relative_path):
-        print(f"Error: File '{relative_path}' does not exist.")
-        sys.exit(1)
+    Args:
+        file_path (str): C言語ソースファイルのパス
+        relative_path (str): 出力先のフォルダ構成に使う相対パス（省略時は file_path）
+    """
+    if relative_path is None:
+        relative_path = file_path
     
     # C言語ファイルかどうかの確認
-    if not relative_path.lower().endswith(('.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')):
-        print(f"Warning: '{relative_path}' may not be a C/C++ source file.")
+    if not str(file_path).lower().endswith(('.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')):
+        print(f"Warning: '{file_path}' may not be a C/C++ source file.")
     
-    print(f"Analyzing file: {relative_path}")
+    print(f"Analyzing file: {file_path}")
     
     # マジックナンバーを抽出
-    magic_numbers = extract_magic_numbers(relative_path)
+    magic_numbers = extract_magic_numbers(file_path)
     
+    save_results(magic_numbers, relative_path)
+
+def save_results(magic_numbers, relative_path):
+    """
+    抽出したマジックナンバーをCSVファイルに保存し、結果の概要を表示する
+    
+    Args:
+        magic_numbers (list): マジックナンバーのリスト
+        relative_path (str): 出力先のフォルダ構成に使う相対パス
+    """
     if not magic_numbers:
         print("No magic numbers found.")
         return
@@ -184,9 +236,81 @@ def main():
     
     # 結果の一部を表示
     print("\nFirst 5 magic numbers found:")
-    for i, item in enumerate(magic_numbers[:5]):
-        print(f"  Line {item['line']}, Column {item['column']}: {item['number']}")
-        print(f"    Context: {item['context']}")
+    for line_num, column, number, context in magic_numbers[:5]:
+        print(f"  Line {line_num}, Column {column}: {number}")
+        print(f"    Context: {context}")
+
+def find_source_files(root, patterns):
+    """
+    ディレクトリ配下からパターンに一致するファイルを再帰的に探す
+    
+    Args:
+        root (Path): 探索するディレクトリ
+        patterns (str): カンマ区切りのglobパターン（例: '*.c,*.h'）
+    
+    Returns:
+        list: 一致したファイルのパスのリスト（重複なし、パス順）
+    """
+    files = set()
+    for pattern in patterns.split(','):
+        pattern = pattern.strip()
+        if pattern:
+            files.update(path for path in root.rglob(pattern) if path.is_file())
+    return sorted(files)
+
+def main():
+    """
+    メイン関数
+    """
+    parser = argparse.ArgumentParser(
+        description='C言語ソースファイルからマジックナンバーを抽出してCSV化するツール'
+    )
+    parser.add_argument(
+        'relative_path', nargs='?',
+        help='入力するC言語ソースファイルの相対パス'
+    )
+    parser.add_argument(
+        '--recurse', metavar='PATH',
+        help='指定したディレクトリ配下のファイルをまとめて処理する'
+    )
+    parser.add_argument(
+        '--glob', default='*.c,*.h',
+        help='--recurse で処理するファイルのパターン（カンマ区切り、省略時は *.c,*.h）'
+    )
+    
+    args = parser.parse_args()
+    
+    if args.recurse:
+        root = Path(args.recurse)
+        if not root.is_dir():
+            print(f"Error: Directory '{args.recurse}' does not exist.")
+            sys.exit(1)
+        
+        # 全ファイルを1回の起動で処理し、正規表現のコンパイルもプロセスごとに1回で済ませる
+        # ファイルごとに独立しているため、抽出はCPUコア数分のプロセスで並列に行い、
+        # 保存と表示は元のプロセスでファイル順に行う
+        files = find_source_files(root, args.glob)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = executor.map(extract_magic_numbers, map(str, files), chunksize=16)
+            for file_path, magic_numbers in zip(files, results):
+                print(f"Analyzing file: {file_path}")
+                save_results(magic_numbers, file_path.relative_to(root))
+        
+        print(f"\nProcessed {len(files)} files.")
+        return
+    
+    if args.relative_path is None:
+        parser.print_usage()
+        sys.exit(1)
+    
+    relative_path = args.relative_path
+    
+    # ファイルの存在確認
+    if not os.path.exists(relative_path):
+        print(f"Error: File '{relative_path}' does not exist.")
+        sys.exit(1)
+    
+    process_file(relative_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,71 +5,144 @@ import re
 import os
 import csv
 import sys
+import mmap
+import codecs
+import functools
 from typing import List, Dict, Tuple, Optional
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+# メンバ変数の正規表現パターン
+_MEMBER_RE = re.compile(
+    r'(?P<type>(?:const\s+)?(?:unsigned\s+|signed\s+)?(?:struct\s+)?(?:enum\s+)?\w+(?:\s*\*)*)\s+'
+    r'(?P<name>\w+)(?:\[(?P<array_size>[^\]]*)\])?\s*(?::\s*(?P<bit_field>\d+))?\s*;'
+)
+
+# 空白文字の連続
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=4096)
+def _members_for_body(normalized_body: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    空白を正規化した構造体本体から (メンバ型, メンバ名) のタプルを抽出
+    
+    同じ本体を持つ構造体（複数ファイルから読み込まれるヘッダなど）は
+    インスタンスをまたいで解析結果を再利用する。
+    """
+    members = []
+    
+    for match in _MEMBER_RE.finditer(normalized_body):
+        member_type = match.group('type').strip()
+        member_name = match.group('name').strip()
+        array_size = match.group('array_size') if match.group('array_size') else ''
+        bit_field = match.group('bit_field') if match.group('bit_field') else ''
+        
+        # 配列の場合は型に配列情報を追加
+        if array_size:
+            member_type += f'[{array_size}]'
+        
+        # ビットフィールドの場合は型に情報を追加
+        if bit_field:
+            member_type += f' : {bit_field}'
+        
+        # 型名（int, char など）は多数の構造体で繰り返し現れるため、同じ文字列オブジェクトを共有する
+        members.append((sys.intern(member_type), member_name))
+    
+    return tuple(members)
 
 
 class CStructExtractor:
     def __init__(self):
-        # 構造体定義の正規表現パターン
+        # 構造体定義の先頭（本体の開始 '{' まで）の正規表現パターン（UTF-8のバイト列に直接適用する）
+        # 本体は波括弧の対応を数えて求めるため、パターンには含めない
+        # 識別子には非ASCII文字（UTF-8の0x80以上のバイト）も含める
         self.struct_pattern = re.compile(
-            r'typedef\s+struct\s*(?P<tag_name>\w+)?\s*\{(?P<body>.*?)\}\s*(?P<typedef_name>\w+)\s*;|'
-            r'struct\s+(?P<struct_name>\w+)\s*\{(?P<struct_body>.*?)\}\s*;',
-            re.DOTALL | re.MULTILINE
+            rb'typedef\s+struct\s*(?P<tag_name>[\w\x80-\xff]+)?\s*\{|'
+            rb'struct\s+(?P<struct_name>[\w\x80-\xff]+)\s*\{'
         )
         
+        # 構造体定義の末尾（本体の '}' の直後）の正規表現パターン
+        self.typedef_tail_pattern = re.compile(rb'\s*(?P<typedef_name>[\w\x80-\xff]+)\s*;')
+        self.struct_tail_pattern = re.compile(rb'\s*;')
+        
         # メンバ変数の正規表現パターン
-        self.member_pattern = re.compile(
-            r'(?P<type>(?:const\s+)?(?:unsigned\s+|signed\s+)?(?:struct\s+)?(?:enum\s+)?\w+(?:\s*\*)*)\s+'
-            r'(?P<name>\w+)(?:\[(?P<array_size>[^\]]*)\])?\s*(?::\s*(?P<bit_field>\d+))?\s*;'
-        )
+        self.member_pattern = _MEMBER_RE
         
 
 
 
 
-    def read_file(self, file_path: str) -> str:
-        """ファイルを読み込み"""
+    def read_file(self, file_path: str):
+        """
+        ファイルをUTF-8のバイト列として読み込み
+        
+        UTF-8のファイルはメモリマップをそのまま返し、ファイル全体のデコードやコピーを行わない。
+        Shift_JIS/CP932のファイルは2バイト目にASCIIの記号（'}'など）が現れ得るため、
+        UTF-8に変換したバイト列を返す。空のファイルは空のバイト列を返す。
+        """
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        if self.is_utf8(mapped):
+            return mapped
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except UnicodeDecodeError:
             # UTF-8で読めない場合はShift_JISやCP932を試す
             try:
-                with open(file_path, 'r', encoding='shift_jis') as f:
-                    return f.read()
+                text = mapped[:].decode('shift_jis')
             except UnicodeDecodeError:
-                with open(file_path, 'r', encoding='cp932') as f:
-                    return f.read()
+                text = mapped[:].decode('cp932')
+        finally:
+            mapped.close()
+        return text.encode('utf-8')
 
-    def extract_struct_members(self, struct_body: str) -> List[Dict[str, str]]:
-        """構造体のメンバを抽出"""
-        members = []
+    def is_utf8(self, data, chunk_size: int = 1 << 20) -> bool:
+        """バイト列がUTF-8として正しいかを、一定サイズずつデコードして確認"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for start in range(0, len(data), chunk_size):
+                decoder.decode(data[start:start + chunk_size])
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def find_closing_brace(self, content, start: int) -> int:
+        """
+        開始位置の直前にある '{' に対応する '}' の位置を返す（見つからない場合は -1）
         
-        # 改行やタブを正規化
-        struct_body = re.sub(r'\s+', ' ', struct_body.strip())
+        '{' と '}' の位置を bytes.find で順に求め、入れ子の深さを数える。
+        """
+        depth = 1
+        open_pos = content.find(b'{', start)
+        close_pos = content.find(b'}', start)
         
-        # メンバ変数を検索
-        for match in self.member_pattern.finditer(struct_body):
-            member_type = match.group('type').strip()
-            member_name = match.group('name').strip()
-            array_size = match.group('array_size') if match.group('array_size') else ''
-            bit_field = match.group('bit_field') if match.group('bit_field') else ''
-            
-            # 配列の場合は型に配列情報を追加
-            if array_size:
-                member_type += f'[{array_size}]'
-            
-            # ビットフィールドの場合は型に情報を追加
-            if bit_field:
-                member_type += f' : {bit_field}'
-            
-            members.append({
-                'type': member_type,
-                'name': member_name
-            })
+        while close_pos != -1:
+            if open_pos != -1 and open_pos < close_pos:
+                depth += 1
+                open_pos = content.find(b'{', open_pos + 1)
+            else:
+                depth -= 1
+                if depth == 0:
+                    return close_pos
+                close_pos = content.find(b'}', close_pos + 1)
         
-        return members
+        return -1
+
+    def extract_struct_members(self, struct_body: str) -> List[Dict[str, str]]:
+        """構造体のメンバを抽出"""
+        # 改行やタブを正規化（正規化後の本体ごとに解析結果をキャッシュ）
+        struct_body = _WHITESPACE_RE.sub(' ', struct_body.strip())
+        
+        return [
+            {'type': member_type, 'name': member_name}
+            for member_type, member_name in _members_for_body(struct_body)
+        ]
 
     def extract_structs_from_file(self, file_path: str) -> List[Dict]:
         """ファイルから構造体を抽出"""
@@ -86,30 +159,56 @@ class CStructExtractor:
             
             structs = []
             
-            for match in self.struct_pattern.finditer(content):
-                # typedef struct の場合
-                if match.group('typedef_name'):
-                    struct_name = match.group('typedef_name')
-                    tag_name = match.group('tag_name') if match.group('tag_name') else ''
-                    body = match.group('body')
-                # struct の場合
-                elif match.group('struct_name'):
-                    struct_name = match.group('struct_name')
-                    tag_name = struct_name
-                    body = match.group('struct_body')
-                else:
-                    continue
-                
-                members = self.extract_struct_members(body)
-                
-                struct_info = {
-                    'file_path': file_path,
-                    'struct_name': struct_name,
-                    'tag_name': tag_name,
-                    'members': members
-                }
+            try:
+                # 'struct' を含まないファイルは正規表現による走査を行わない
+                if content.find(b'struct') == -1:
+                    return structs
                 
-                structs.append(struct_info)
+                pos = 0
+                while True:
+                    match = self.struct_pattern.search(content, pos)
+                    if not match:
+                        break
+                    
+                    # 本体の '{' に対応する '}' を探し、その直後が定義の末尾になっているか確認
+                    close_pos = self.find_closing_brace(content, match.end())
+                    tail = None
+                    if close_pos != -1:
+                        if match.group('struct_name'):
+                            tail = self.struct_tail_pattern.match(content, close_pos + 1)
+                        else:
+                            tail = self.typedef_tail_pattern.match(content, close_pos + 1)
+                    
+                    if not tail:
+                        # 構造体定義として閉じていない場合は次の位置から探し直す
+                        pos = match.start() + 1
+                        continue
+                    pos = tail.end()
+                    
+                    # typedef struct の場合
+                    if match.group('struct_name') is None:
+                        struct_name = tail.group('typedef_name')
+                        tag_name = match.group('tag_name') if match.group('tag_name') else b''
+                    # struct の場合
+                    else:
+                        struct_name = match.group('struct_name')
+                        tag_name = struct_name
+                    body = content[match.end():close_pos]
+                    
+                    # マッチした部分だけをデコード
+                    members = self.extract_struct_members(body.decode('utf-8'))
+                    
+                    struct_info = {
+                        'file_path': file_path,
+                        'struct_name': sys.intern(struct_name.decode('utf-8')),
+                        'tag_name': sys.intern(tag_name.decode('utf-8')),
+                        'members': members
+                    }
+                    
+                    structs.append(struct_info)
+            finally:
+                if isinstance(content, mmap.mmap):
+                    content.close()
             
             return structs
             
@@ -175,24 +274,76 @@ class CStructExtractor:
         
         self.save_to_csv(csv_data, output_path)
 
+    def find_source_files(self, root: str, patterns: str) -> List[str]:
+        """ディレクトリ配下からカンマ区切りのglobパターンに一致するファイルを再帰的に探す"""
+        files = set()
+        for pattern in patterns.split(','):
+            pattern = pattern.strip()
+            if pattern:
+                files.update(str(path) for path in Path(root).rglob(pattern) if path.is_file())
+        return sorted(files)
+
+    def process_directory(self, root: str, patterns: str = '*.c,*.h', output_path: str = None):
+        """ディレクトリ配下のファイルをまとめて処理し、1つのCSVに保存"""
+        if not os.path.isdir(root):
+            print(f"ディレクトリが見つかりません: {root}")
+            return
+        
+        # 全ファイルを1回の起動で処理し、ファイルごとに独立した抽出は
+        # CPUコア数分のプロセスで並列に行う（結果はファイル順に結合）
+        files = self.find_source_files(root, patterns)
+        structs = []
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for file_structs in executor.map(self.extract_structs_from_file, files, chunksize=16):
+                structs.extend(file_structs)
+        
+        print(f"{len(files)} 個のファイルを処理しました。")
+        
+        if not structs:
+            print("構造体が見つかりませんでした。")
+            return
+        
+        print(f"構造体を {len(structs)} 個発見しました。")
+        
+        csv_data = self.structs_to_csv_data(structs)
+        
+        if output_path is None:
+            # 出力ファイル名をディレクトリ名から自動生成
+            output_path = f"{Path(root).resolve().name}_structs.csv"
+        
+        self.save_to_csv(csv_data, output_path)
+
 
 def main():
     parser = argparse.ArgumentParser(
         description='C言語ソースファイルから構造体宣言を抽出してCSV化するツール'
     )
     parser.add_argument(
-        'input_file', 
+        'input_file', nargs='?',
         help='入力するC言語ソースファイルのパス (.c または .h)'
     )
     parser.add_argument(
         '-o', '--output', 
         help='出力CSVファイルのパス (省略時は自動生成)'
     )
+    parser.add_argument(
+        '--recurse', metavar='PATH',
+        help='指定したディレクトリ配下のファイルをまとめて処理し、1つのCSVに出力する'
+    )
+    parser.add_argument(
+        '--glob', default='*.c,*.h',
+        help='--recurse で処理するファイルのパターン (カンマ区切り、省略時は *.c,*.h)'
+    )
     
     args = parser.parse_args()
     
     extractor = CStructExtractor()
-    extractor.process_file(args.input_file, args.output)
+    if args.recurse:
+        extractor.process_directory(args.recurse, args.glob, args.output)
+    elif args.input_file:
+        extractor.process_file(args.input_file, args.output)
+    else:
+        parser.print_usage()
 
 
 if __name__ == "__main__":
@@ -201,6 +352,7 @@ if __name__ == "__main__":
         print("使用例:")
         print("python struct_extractor.py sample.c")
         print("python struct_extractor.py sample.h -o output.csv")
+        print("python struct_extractor.py --recurse src --glob '*.c,*.h' -o output.csv")
         print("\n直接実行する場合:")
         
         # テスト用のサンプル
@@ -9,6 +9,23 @@ from typing import List, Dict, Tuple, Optional
 import argparse
 from collections import defaultdict
 
+# Aho-Corasick法による複数文字列検索（pyahocorasick）は任意の依存ライブラリ
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 構造体変数宣言の列名（宣言は列ごとのリストで保持し、各リストの同じ位置が1行に対応する）
+DECLARATION_COLUMNS = (
+    'struct_name', 'var_name', 'member_name', 'init_value', 'array_size',
+    'declaration_id', 'element_index'
+)
+
+# 結果CSVに出力する列
+CSV_COLUMNS = ('struct_name', 'var_name', 'member_name', 'init_value', 'array_size')
+
+# 構造体メンバの情報 (メンバ名, メンバ型, メンバ番号)
+MemberInfo = Tuple[str, str, int]
 
 class StructConfigAnalyzer:
     def __init__(self):
@@ -28,22 +45,43 @@ class StructConfigAnalyzer:
         self.simple_struct_var_pattern = re.compile(
             r'(?P<struct_name>\w+)\s+(?P<var_name>\w+)(?P<array_def>\[(?P<array_size>[^\]]*)\])?\s*;'
         )
+        
+        # 初期化値の区切りパターン（波括弧・カンマ、および読み飛ばす文字列/文字リテラル）
+        # それ以外の文字は正規表現エンジン内で読み飛ばし、位置だけを使って値を切り出す
+        self.init_delimiter_pattern = re.compile(
+            r'[{},]|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\''
+        )
 
-    def read_csv_structs(self, csv_path: str) -> Dict[str, List[Dict]]:
+    def read_csv_structs(self, csv_path: str) -> Dict[str, List[MemberInfo]]:
         """CSVファイルから構造体情報を読み込み"""
         structs = defaultdict(list)
         
         try:
             with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    return {}
+                
+                # 列の位置はヘッダーから一度だけ求める
+                column_index = {name: i for i, name in enumerate(header)}
+                struct_col = column_index['構造体名']
+                number_col = column_index['メンバ番号']
+                type_col = column_index['メンバ型']
+                name_col = column_index['メンバ名']
+                row_length = max(struct_col, number_col, type_col, name_col) + 1
+                
                 for row in reader:
-                    struct_name = row['構造体名']
-                    if row['メンバ名']:  # メンバ名が空でない場合のみ追加
-                        structs[struct_name].append({
-                            'member_name': row['メンバ名'],
-                            'member_type': row['メンバ型'],
-                            'member_number': int(row['メンバ番号']) if row['メンバ番号'].isdigit() else 0
-                        })
+                    # 列が足りない行やメンバ名が空の行は追加しない
+                    if len(row) < row_length or not row[name_col]:
+                        continue
+                    member_number = row[number_col]
+                    # 構造体名・型名は多くの行で繰り返し現れるため、同じ文字列オブジェクトを共有する
+                    structs[sys.intern(row[struct_col])].append((
+                        row[name_col],
+                        sys.intern(row[type_col]),
+                        int(member_number) if member_number.isdigit() else 0
+                    ))
         except Exception as e:
             print(f"CSVファイル読み込みエラー: {e}")
             return {}
@@ -63,7 +101,7 @@ class StructConfigAnalyzer:
                 with open(file_path, 'r', encoding='cp932') as f:
                     return f.read()
 
-    def parse_init_values(self, init_str: str, members: List[Dict]) -> Dict[str, str]:
+    def parse_init_values(self, init_str: str, members: List[MemberInfo]) -> Dict[str, str]:
         """初期化値を解析してメンバごとの値を抽出"""
         member_values = {}
         
@@ -72,35 +110,35 @@ class StructConfigAnalyzer:
         if init_str.startswith('{') and init_str.endswith('}'):
             init_str = init_str[1:-1].strip()
         
-        # カンマで分割（ネストした構造体は考慮しない簡易版）
+        # トップレベルのカンマの位置で分割（文字列リテラル内のカンマでは分割しない）
         values = []
         bracket_count = 0
-        current_value = ""
+        value_start = 0
         
-        for char in init_str:
-            if char == '{':
+        for match in self.init_delimiter_pattern.finditer(init_str):
+            delimiter = match.group()
+            if delimiter == '{':
                 bracket_count += 1
-            elif char == '}':
+            elif delimiter == '}':
                 bracket_count -= 1
-            elif char == ',' and bracket_count == 0:
-                values.append(current_value.strip())
-                current_value = ""
-                continue
-            current_value += char
+            elif delimiter == ',' and bracket_count == 0:
+                values.append(init_str[value_start:match.start()].strip())
+                value_start = match.end()
         
-        if current_value.strip():
-            values.append(current_value.strip())
+        last_value = init_str[value_start:].strip()
+        if last_value:
+            values.append(last_value)
         
         # メンバ名と値を対応付け
-        for i, member in enumerate(members):
+        for i, (member_name, _, _) in enumerate(members):
             if i < len(values):
-                member_values[member['member_name']] = values[i]
+                member_values[member_name] = values[i]
             else:
-                member_values[member['member_name']] = ""
+                member_values[member_name] = ""
         
         return member_values
 
-    def parse_array_init_values(self, init_str: str, members: List[Dict]) -> List[Dict[str, str]]:
+    def parse_array_init_values(self, init_str: str, members: List[MemberInfo]) -> List[Dict[str, str]]:
         """配列の初期化値を解析"""
         array_elements = []
         
@@ -109,38 +147,107 @@ class StructConfigAnalyzer:
         if init_str.startswith('{') and init_str.endswith('}'):
             init_str = init_str[1:-1].strip()
         
-        # 各要素（構造体）を抽出
+        # 最も外側の波括弧の組ごとに各要素（構造体）を切り出す
         bracket_count = 0
-        current_element = ""
+        element_start = 0
         
-        for char in init_str:
-            if char == '{':
+        for match in self.init_delimiter_pattern.finditer(init_str):
+            delimiter = match.group()
+            if delimiter == '{':
                 bracket_count += 1
-            elif char == '}':
+                if bracket_count == 1:
+                    element_start = match.start()
+            elif delimiter == '}':
                 bracket_count -= 1
-                current_element += char
                 if bracket_count == 0:
                     # 一つの構造体要素が完成
-                    element_values = self.parse_init_values(current_element, members)
+                    element_values = self.parse_init_values(init_str[element_start:match.end()], members)
                     array_elements.append(element_values)
-                    current_element = ""
+        
+        return array_elements
+
+    def find_struct_name_positions(self, content: str, structs_info: Dict[str, List[MemberInfo]]) -> List[int]:
+        """
+        既知の構造体名が識別子として現れる位置を、ファイル内の順に返す
+        
+        全ての構造体名を1回の走査で検索する。pyahocorasick がある場合は Aho-Corasick 法、
+        ない場合は構造体名を選択肢にした正規表現を使う。
+        """
+        names = [struct_name for struct_name in structs_info if struct_name]
+        if not names:
+            return []
+        
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for struct_name in names:
+                automaton.add_word(struct_name, len(struct_name))
+            automaton.make_automaton()
+            
+            positions = []
+            for end, length in automaton.iter(content):
+                start = end - length + 1
+                # 識別子の一部として現れたものは対象外
+                if start > 0 and (content[start - 1].isalnum() or content[start - 1] == '_'):
                     continue
-            elif char == ',' and bracket_count == 0:
+                if end + 1 < len(content) and (content[end + 1].isalnum() or content[end + 1] == '_'):
+                    continue
+                positions.append(start)
+            return positions
+        
+        names_pattern = re.compile(r'(?<!\w)(?:' + '|'.join(map(re.escape, names)) + r')(?!\w)')
+        return [match.start() for match in names_pattern.finditer(content)]
+
+    def find_struct_matches(self, pattern, content: str, positions: List[int],
+                            structs_info: Dict[str, List[MemberInfo]]) -> List:
+        """
+        構造体名の出現位置でのみパターンを照合し、マッチをファイル内の順に返す
+        
+        ファイル全体を正規表現で走査する代わりに、出現位置に固定してパターンを照合する。
+        """
+        matches = []
+        last_end = 0
+        for pos in positions:
+            # 既に見つかった宣言の内側は照合しない
+            if pos < last_end:
                 continue
-            
-            if bracket_count > 0:
-                current_element += char
+            match = pattern.match(content, pos)
+            if match and match.group('struct_name') in structs_info:
+                matches.append(match)
+                last_end = match.end()
         
-        return array_elements
+        return matches
+
+    def add_declaration_rows(self, declarations: Dict[str, List], struct_name: str, var_name: str,
+                             member_names: List[str], init_values: List[str], array_size: str,
+                             declaration_id: int, element_index: Optional[int]):
+        """1つの構造体変数（または配列要素）のメンバ数分の行を各列のリストに追加"""
+        count = len(member_names)
+        declarations['struct_name'].extend([struct_name] * count)
+        declarations['var_name'].extend([var_name] * count)
+        declarations['member_name'].extend(member_names)
+        declarations['init_value'].extend(init_values)
+        declarations['array_size'].extend([array_size] * count)
+        declarations['declaration_id'].extend([declaration_id] * count)
+        declarations['element_index'].extend([element_index] * count)
 
-    def extract_struct_declarations(self, content: str, structs_info: Dict[str, List[Dict]]) -> List[Dict]:
-        """構造体変数宣言を抽出"""
-        declarations = []
+    def extract_struct_declarations(self, content: str, structs_info: Dict[str, List[MemberInfo]]) -> Dict[str, List]:
+        """
+        構造体変数宣言を抽出
+        
+        Returns:
+            DECLARATION_COLUMNS の列名ごとに値のリストを持つ辞書
+        """
+        declarations = {column: [] for column in DECLARATION_COLUMNS}
+        # (構造体名, 変数名) ごとの宣言数と、出力済みの (構造体名, 変数名)
         declaration_counter = defaultdict(int)
+        declared = set()
+        
+        # 構造体名の出現位置を先に求め、以降の照合はその位置だけで行う
+        positions = self.find_struct_name_positions(content, structs_info)
         
         # 初期化ありの構造体変数を検索
-        for match in self.struct_var_pattern.finditer(content):
-            struct_name = match.group('struct_name')
+        for match in self.find_struct_matches(self.struct_var_pattern, content, positions, structs_info):
+            struct_name = sys.intern(match.group('struct_name'))
             var_name = match.group('var_name')
             array_size = match.group('array_size') if match.group('array_size') else None
             init_value = match.group('init_value')
@@ -148,10 +255,12 @@ class StructConfigAnalyzer:
             if struct_name not in structs_info:
                 continue
             
-            declaration_counter[f"{struct_name}_{var_name}"] += 1
-            declaration_id = declaration_counter[f"{struct_name}_{var_name}"]
+            key = (struct_name, var_name)
+            declaration_counter[key] += 1
+            declaration_id = declaration_counter[key]
             
             members = structs_info[struct_name]
+            member_names = [member_name for member_name, _, _ in members]
             
             if array_size:
                 # 配列の場合
@@ -159,77 +268,57 @@ class StructConfigAnalyzer:
                 array_elements = self.parse_array_init_values(init_value, members)
                 
                 for element_index, element_values in enumerate(array_elements):
-                    for member in members:
-                        member_name = member['member_name']
-                        member_value = element_values.get(member_name, "")
-                        
-                        declarations.append({
-                            'struct_name': struct_name,
-                            'var_name': var_name_with_array,
-                            'member_name': member_name,
-                            'init_value': member_value,
-                            'array_size': array_size,
-                            'declaration_id': declaration_id,
-                            'element_index': element_index
-                        })
+                    init_values = [element_values.get(member_name, "") for member_name in member_names]
+                    self.add_declaration_rows(
+                        declarations, struct_name, var_name_with_array, member_names, init_values,
+                        array_size, declaration_id, element_index
+                    )
+                
+                if array_elements and member_names:
+                    declared.add(key)
             else:
                 # 単一構造体の場合
                 member_values = self.parse_init_values(init_value, members)
+                init_values = [member_values.get(member_name, "") for member_name in member_names]
+                self.add_declaration_rows(
+                    declarations, struct_name, var_name, member_names, init_values,
+                    "", declaration_id, None
+                )
                 
-                for member in members:
-                    member_name = member['member_name']
-                    member_value = member_values.get(member_name, "")
-                    
-                    declarations.append({
-                        'struct_name': struct_name,
-                        'var_name': var_name,
-                        'member_name': member_name,
-                        'init_value': member_value,
-                        'array_size': "",
-                        'declaration_id': declaration_id,
-                        'element_index': None
-                    })
+                if member_names:
+                    declared.add(key)
         
         # 初期化なしの構造体変数も検索
-        for match in self.simple_struct_var_pattern.finditer(content):
-            struct_name = match.group('struct_name')
+        for match in self.find_struct_matches(self.simple_struct_var_pattern, content, positions, structs_info):
+            struct_name = sys.intern(match.group('struct_name'))
             var_name = match.group('var_name')
             array_size = match.group('array_size') if match.group('array_size') else None
             
             if struct_name not in structs_info:
                 continue
             
-            # 既に初期化ありで見つかっているものは除外
-            full_match_found = False
-            for decl in declarations:
-                if (decl['struct_name'] == struct_name and 
-                    decl['var_name'].replace('[]', '') == var_name):
-                    full_match_found = True
-                    break
-            
-            if full_match_found:
+            # 既に見つかっているものは除外
+            key = (struct_name, var_name)
+            if key in declared:
                 continue
             
-            declaration_counter[f"{struct_name}_{var_name}"] += 1
-            declaration_id = declaration_counter[f"{struct_name}_{var_name}"]
+            declaration_counter[key] += 1
+            declaration_id = declaration_counter[key]
             
-            members = structs_info[struct_name]
+            member_names = [member_name for member_name, _, _ in structs_info[struct_name]]
             var_display_name = f"{var_name}[]" if array_size else var_name
             
-            for member in members:
-                declarations.append({
-                    'struct_name': struct_name,
-                    'var_name': var_display_name,
-                    'member_name': member['member_name'],
-                    'init_value': "",
-                    'array_size': array_size if array_size else "",
-                    'declaration_id': declaration_id,
-                    'element_index': None
-                })
+            self.add_declaration_rows(
+                declarations, struct_name, var_display_name, member_names, [""] * len(member_names),
+                array_size if array_size else "", declaration_id, None
+            )
+            
+            if member_names:
+                declared.add(key)
         
         return declarations
 
-    def create_result_csv(self, declarations: List[Dict], target_file_path: str):
+    def create_result_csv(self, declarations: Dict[str, List], target_file_path: str):
         """結果CSVを作成"""
         # 出力フォルダを作成
         output_dir = "result_struct_config"
@@ -240,28 +329,14 @@ class StructConfigAnalyzer:
         output_filename = f"struct_config_{base_name}.csv"
         output_path = os.path.join(output_dir, output_filename)
         
-        # CSVデータを準備
-        csv_data = []
-        csv_data.append([
-            '構造体名', '変数名', 'メンバ名', '初期値', '配列要素数'
-        ])
-        
-        for decl in declarations:
-            csv_data.append([
-                decl['struct_name'],
-                decl['var_name'],
-                decl['member_name'],
-                decl['init_value'],
-                decl['array_size']
-            ])
-        
-        # CSVファイルに保存
+        # CSVファイルに保存（列ごとのリストを行に転置して一括で書き込み）
         try:
             with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
                 writer = csv.writer(f)
-                writer.writerows(csv_data)
+                writer.writerow(['構造体名', '変数名', 'メンバ名', '初期値', '配列要素数'])
+                writer.writerows(zip(*(declarations[column] for column in CSV_COLUMNS)))
             print(f"結果CSVファイルを保存しました: {output_path}")
-            print(f"抽出された宣言数: {len(declarations)}")
+            print(f"抽出された宣言数: {len(declarations['struct_name'])}")
         except Exception as e:
             print(f"CSVファイル保存中にエラーが発生しました: {e}")
 
@@ -288,7 +363,7 @@ class StructConfigAnalyzer:
         # 構造体宣言を抽出
         declarations = self.extract_struct_declarations(content, structs_info)
         
-        if not declarations:
+        if not declarations['struct_name']:
             print("構造体変数の宣言が見つかりませんでした。")
             return
         
@@ -1,6 +1,50 @@
+import os
 import re
+import mmap
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from Regex_Engine import compile_regex
+
+# テーブル宣言の開始行を判定する正規表現（読み込み時に一度だけコンパイル）
+# 基本的な配列宣言・構造体配列・初期化を伴う配列宣言を1つのパターンにまとめている
+# （型名の候補 char|short|int|long|float|double|\w+_t は \w+ に含まれ、
+#   初期化を伴う配列宣言 \w+\s+\w+\s*\[.*\]\s*= は基本的な配列宣言に含まれる）
+_DECL_START_PAT = re.compile(
+    r'\s*(?:static\s+|const\s+|extern\s+)*'
+    r'(?:struct\s+\w+\s+\w+\s*\['                                # 構造体配列
+    r'|(?:unsigned\s+)?(?:void\s*\*|\w+)\s*\*?\s+\w+\s*\[)'     # 基本的な配列宣言
+)
+
+# 関数宣言・関数定義を検出する正規表現
+_FUNC_DECL_PAT = re.compile(r'\w+\s*\([^)]*\)\s*(?:\{|;)')
+
+# 関数定義を検出する正規表現
+_VALID_FUNC_PAT = re.compile(r'\w+\s*\([^)]*\)\s*\{')
+
+# テーブルの初期化子内の波括弧（文字列・文字リテラルは読み飛ばすために検出する）
+# リテラル部分はバックトラックが増えないよう、展開したループ形式で記述
+_BRACE_TOKEN_PAT = compile_regex(r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\'|[{}]')
+
+# 末尾が ';' の行（テーブル宣言の終わり）
+_STATEMENT_END_PAT = re.compile(r';[^\S\n]*$', re.MULTILINE)
+
+# 文字列リテラル（グループ1）とコメント（グループ2）を検出する正規表現
+# VERBOSE や DOTALL/MULTILINE を使わず、改行を含む任意の文字は [\s\S] で表す
+# 閉じていないリテラルやコメントで極端なバックトラックが起きないよう、
+# 同じ文字に複数の分岐がマッチしない展開したループ形式で記述している
+# 後方参照や先読みを使わないため、RE2 が有効な場合は RE2 でコンパイルされる
+_COMMENT_PAT = compile_regex(
+    r'("[^"\\]*(?:\\[\s\S][^"\\]*)*"|\'[^\'\\]*(?:\\[\s\S][^\'\\]*)*\')'   # 文字列リテラル
+    r'|(//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)'                             # コメント
+)
+
+# テーブル抽出の対象とするC/C++のソース・ヘッダファイルの拡張子
+_SOURCE_SUFFIXES = frozenset({'.c', '.h', '.cc', '.cpp', '.hh', '.hpp'})
+
+# バイナリファイルの判定に使う先頭部分のバイト数（この範囲にNUL文字があればバイナリとみなす）
+_BINARY_CHECK_SIZE = 8192
+
 def extract_tables_from_file(file_path):
     """
     指定されたパスのC/Hファイルからテーブル宣言を抽出し、result_tableフォルダに出力
@@ -11,6 +55,11 @@ def extract_tables_from_file(file_path):
     # Pathオブジェクトに変換
     input_path = Path(file_path) if isinstance(file_path, str) else file_path
     
+    # C/C++のソース・ヘッダ以外は読み込まずにスキップ
+    if input_path.suffix.lower() not in _SOURCE_SUFFIXES:
+        print(f"スキップ: 対象外の拡張子です - {input_path}")
+        return
+    
     # 入力ファイルが存在しない場合はエラー
     if not input_path.exists():
         print(f"エラー: ファイルが存在しません - {input_path}")
@@ -27,9 +76,8 @@ def extract_tables_from_file(file_path):
     table_output_path.parent.mkdir(parents=True, exist_ok=True)
     
     try:
-        # ファイルを読み込み
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # ファイルを読み込み（UTF-8で読み込めない場合はcp932でデコード）
+        content, encoding = _read_text(input_path)
         
         # テーブル宣言を抽出
         table_declarations = extract_tables(content)
@@ -45,36 +93,66 @@ def extract_tables_from_file(file_path):
             else:
                 f.write("// No table declarations found\n")
         
-        print(f"処理完了: {input_path}")
+        if encoding == 'utf-8':
+            print(f"処理完了: {input_path}")
+        else:
+            print(f"処理完了 ({encoding}): {input_path}")
         print(f"  テーブル宣言: {len(table_declarations)}個 -> {table_output_path}")
-        
-    except UnicodeDecodeError:
-        # UTF-8で読み込めない場合はcp932で試行
-        try:
-            with open(input_path, 'r', encoding='cp932') as f:
-                content = f.read()
-            
-            table_declarations = extract_tables(content)
-            
-            with open(table_output_path, 'w', encoding='utf-8') as f:
-                f.write(f"// Table declarations extracted from {input_path}\n")
-                f.write("// " + "="*60 + "\n\n")
-                if table_declarations:
-                    for i, table in enumerate(table_declarations, 1):
-                        f.write(f"// Table {i}\n")
-                        f.write(table + "\n\n")
-                else:
-                    f.write("// No table declarations found\n")
-            
-            print(f"処理完了 (cp932): {input_path}")
-            print(f"  テーブル宣言: {len(table_declarations)}個 -> {table_output_path}")
-            
-        except Exception as e:
-            print(f"エラー: ファイルの読み込みに失敗しました - {input_path}: {e}")
     
     except Exception as e:
         print(f"エラー: ファイルの処理に失敗しました - {input_path}: {e}")
 
+def _map_file(input_path):
+    """
+    ファイルを読み取り専用でメモリマップする（空ファイルの場合は空のバイト列を返す）
+    """
+    with open(input_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _read_text(input_path):
+    """
+    ファイルをメモリマップで開き、文字列にデコードする
+    
+    テーブル宣言は必ず '[' を含むため、バイト列のまま検索して含まれない場合は
+    ファイル全体をデコードせずに空文字列を返す。
+    
+    Args:
+        input_path: 読み込むファイルのパス (Path オブジェクト)
+    
+    Returns:
+        tuple: (content, encoding) のタプル
+            - content: 改行コードを'\n'に統一したファイル内容（'[' を含まない場合は空文字列）
+            - encoding: デコードに使用したエンコーディング ('utf-8' または 'cp932')
+    
+    Raises:
+        ValueError: バイナリファイルの場合
+    """
+    data = _map_file(input_path)
+    try:
+        # 先頭部分にNUL文字を含むファイルはバイナリとみなし、デコードせずにエラーとする
+        if data.find(b'\x00', 0, _BINARY_CHECK_SIZE) != -1:
+            raise ValueError("バイナリファイルのため処理できません")
+        
+        if data.find(b'[') == -1:
+            return '', 'utf-8'
+        
+        try:
+            content, encoding = str(data, 'utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            # UTF-8で読み込めない場合はcp932で試行
+            content, encoding = str(data, 'cp932'), 'cp932'
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    
+    # テキストモードでの読み込みと同様に改行コードを統一
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    
+    return content, encoding
+
 def extract_tables(code):
     """
     C/C++のソースコードからテーブル宣言を抽出する
@@ -85,82 +163,77 @@ def extract_tables(code):
     Returns:
         list: テーブル宣言のリスト
     """
-    # コメントを除去（文字列リテラルは保護）
-    code_without_comments = remove_c_comments_for_parsing(code)
-    
-    # テーブル宣言のパターンを検索
-    table_declarations = []
-    
-    # 1. 配列の初期化を伴う宣言を検索
-    # 例: int table[] = {1, 2, 3};
-    #     const char* names[] = {"apple", "banana"};
-    array_patterns = [
-        # 基本的な配列宣言
-        r'(?:(?:static|const|extern)\s+)*(?:unsigned\s+)?(?:char|short|int|long|float|double|void\s*\*|\w+_t|\w+)\s*\*?\s+\w+\s*\[\s*(?:\d+)?\s*\]\s*=\s*\{[^}]*\}\s*;',
-        # 構造体配列
-        r'(?:(?:static|const|extern)\s+)*(?:struct\s+\w+|\w+)\s+\w+\s*\[\s*(?:\d+)?\s*\]\s*=\s*\{[^}]*\}\s*;',
-        # 多次元配列
-        r'(?:(?:static|const|extern)\s+)*(?:unsigned\s+)?(?:char|short|int|long|float|double|\w+_t|\w+)\s+\w+\s*\[\s*\d*\s*\]\s*\[\s*\d*\s*\]\s*=\s*\{[^}]*\}\s*;',
-        # ポインタ配列
-        r'(?:(?:static|const|extern)\s+)*(?:char|void|\w+)\s*\*\s*\w+\s*\[\s*(?:\d+)?\s*\]\s*=\s*\{[^}]*\}\s*;'
-    ]
+    # テーブル宣言は必ず '[' を含むため、なければコメント除去も含めて何もしない
+    if '[' not in code:
+        return []
+    
+    # コメントの開始記号がなければ除去結果は元のコードと同じため、コピーを作らずにそのまま走査
+    if '/*' in code or '//' in code:
+        # コメントを除去（文字列リテラルは保護）
+        code = remove_c_comments_for_parsing(code)
     
     # より確実な方法：ブレース対応を考慮した抽出
-    tables = find_table_declarations(code_without_comments)
+    tables = find_table_declarations(code)
     
     return tables
 
 def find_table_declarations(code):
     """
     ブレースのネストを考慮してテーブル宣言を抽出
+    
+    テーブル宣言は必ず '[' を含むため、str.find で '[' を含む行へ直接移動して判定する。
+    宣言の開始行であれば、対応する '}' の位置を波括弧の深さを数えて1回の走査で求め、
+    元のコードから宣言部分を切り出す。
     """
     tables = []
-    lines = code.split('\n')
-    i = 0
+    pos = 0
     
-    while i < len(lines):
-        line = lines[i].strip()
+    while True:
+        # 配列宣言の候補となる '[' を含む行を探す
+        bracket_pos = code.find('[', pos)
+        if bracket_pos == -1:
+            break
+        
+        line_start = code.rfind('\n', 0, bracket_pos) + 1
+        line_end = code.find('\n', bracket_pos)
+        if line_end == -1:
+            line_end = len(code)
+        line = code[line_start:line_end].strip()
+        pos = line_end
         
         # 配列宣言の開始を検出
-        if is_table_declaration_start(line):
-            # 宣言の開始位置を記録
-            table_start = i
-            table_lines = [lines[i]]
-            
-            # ブレースが開いているかチェック
-            if '{' in line:
-                brace_count = line.count('{') - line.count('}')
-                i += 1
-                
-                # ブレースが閉じるまで行を収集
-                while i < len(lines) and brace_count > 0:
-                    current_line = lines[i]
-                    table_lines.append(current_line)
-                    brace_count += current_line.count('{') - current_line.count('}')
-                    i += 1
-                
-                # セミコロンまで収集（ブレースが閉じた後）
-                if i < len(lines) and brace_count == 0:
-                    last_line = table_lines[-1].strip()
-                    if not last_line.endswith(';'):
-                        while i < len(lines):
-                            current_line = lines[i].strip()
-                            table_lines.append(lines[i])
-                            if current_line.endswith(';'):
-                                i += 1
-                                break
-                            i += 1
-                
-                # テーブル宣言として追加
-                table_declaration = '\n'.join(table_lines)
-                if is_valid_table_declaration(table_declaration):
-                    tables.append(table_declaration.strip())
-            else:
-                # 単一行の配列宣言
-                if ';' in line and is_valid_table_declaration(line):
-                    tables.append(line)
+        if not is_table_declaration_start(line):
+            continue
+        
+        # ブレースが開いているかチェック
+        brace_pos = code.find('{', line_start, line_end)
+        if brace_pos == -1:
+            # 単一行の配列宣言
+            if ';' in line and is_valid_table_declaration(line):
+                tables.append(line)
+            continue
         
-        i += 1
+        # ブレースが閉じるまで読み進め、閉じた行から ';' で終わる行までを宣言とする
+        # （閉じない場合や ';' で終わる行がない場合はコードの末尾まで）
+        table_end = len(code)
+        brace_count = 0
+        for match in _BRACE_TOKEN_PAT.finditer(code, brace_pos):
+            token = match.group()
+            if token == '{':
+                brace_count += 1
+            elif token == '}':
+                brace_count -= 1
+                if brace_count == 0:
+                    end_match = _STATEMENT_END_PAT.search(code, match.start())
+                    if end_match:
+                        table_end = end_match.end()
+                    break
+        pos = table_end
+        
+        # テーブル宣言として追加
+        table_declaration = code[line_start:table_end]
+        if is_valid_table_declaration(table_declaration):
+            tables.append(table_declaration.strip())
     
     return tables
 
@@ -168,91 +241,63 @@ def is_table_declaration_start(line):
     """
     行がテーブル宣言の開始かどうかを判定
     """
-    # 基本的な配列宣言パターン
-    patterns = [
-        r'^\s*(?:static\s+|const\s+|extern\s+)*(?:unsigned\s+)?(?:char|short|int|long|float|double|void\s*\*|\w+_t|\w+)\s*\*?\s+\w+\s*\[',
-        r'^\s*(?:static\s+|const\s+|extern\s+)*struct\s+\w+\s+\w+\s*\[',
-        r'^\s*(?:static\s+|const\s+|extern\s+)*\w+\s+\w+\s*\[.*\]\s*=',
-    ]
-    
-    for pattern in patterns:
-        if re.search(pattern, line):
-            # 関数宣言ではないことを確認
-            if not re.search(r'\w+\s*\([^)]*\)\s*(?:\{|;)', line):
-                return True
-    
-    return False
+    # 配列宣言の形に一致し、かつ関数宣言ではないことを確認
+    return bool(_DECL_START_PAT.match(line)) and not _FUNC_DECL_PAT.search(line)
 
 def is_valid_table_declaration(declaration):
     """
     有効なテーブル宣言かどうかをチェック
+    
+    安価な判定から順に行い、条件を満たさないことが分かった時点で打ち切る。
     """
-    # 基本的なチェック
-    if not declaration.strip():
+    # typedef宣言ではないことを確認
+    if declaration.lstrip().startswith('typedef'):
         return False
     
-    # 配列ブラケットと初期化ブレースがあるかチェック
-    has_array_bracket = '[' in declaration and ']' in declaration
-    has_initialization = '=' in declaration and ('{' in declaration or '"' in declaration or "'" in declaration)
-    
-    # 関数宣言ではないことを確認
-    is_function = re.search(r'\w+\s*\([^)]*\)\s*\{', declaration)
-    
-    # typedef宣言ではないことを確認
-    is_typedef = declaration.strip().startswith('typedef')
+    # 配列ブラケットと初期化ブレースがあるかチェック（空白のみの宣言もここで除外される）
+    if '[' not in declaration or ']' not in declaration or '=' not in declaration:
+        return False
+    if '{' not in declaration and '"' not in declaration and "'" not in declaration:
+        return False
     
-    return has_array_bracket and has_initialization and not is_function and not is_typedef
+    # 関数宣言ではないことを確認（関数定義は必ず '(' を含むため、ない場合は正規表現を使わない）
+    return '(' not in declaration or not _VALID_FUNC_PAT.search(declaration)
+
+def _replace_comment(match):
+    """文字列リテラルはそのまま返し、コメントは改行のみ残して除去する"""
+    if match.group(1):
+        return match.group(1)
+    else:
+        comment = match.group(2)
+        if comment.startswith('/*'):
+            return '\n' * comment.count('\n')
+        else:
+            return ''
 
 def remove_c_comments_for_parsing(code):
     """
     パース用のコメント除去（簡易版）
     """
     # 文字列リテラルとコメントを処理
-    pattern = r'''
-        (                           # グループ1: 文字列リテラル
-            "(?:[^"\\]|\\.)*"       # ダブルクォート文字列
-            |                       # または
-            '(?:[^'\\]|\\.)*'       # シングルクォート文字列
-        )
-        |                           # または
-        (                           # グループ2: コメント
-            //.*?$                  # 行コメント
-            |                       # または
-            /\*.*?\*/               # ブロックコメント
-        )
-    '''
-    
-    def replace_comment(match):
-        if match.group(1):
-            return match.group(1)
-        else:
-            comment = match.group(2)
-            if comment.startswith('/*'):
-                return '\n' * comment.count('\n')
-            else:
-                return ''
-    
-    return re.sub(pattern, replace_comment, code, flags=re.MULTILINE | re.DOTALL | re.VERBOSE)
+    return _COMMENT_PAT.sub(_replace_comment, code)
 
 # 使用例とテスト用のコード
 if __name__ == "__main__":
     from pathlib import Path
     
-    def get_all_files():
-        """実行ファイルのフォルダ配下にある全てのファイルの相対パスを取得"""
-        script_dir = Path(__file__).parent
-        return [file.relative_to(script_dir) for file in script_dir.rglob('*') if file.is_file()]
-    
-    def filter_c_h_files(file_paths):
-        """パスのリストから.cと.hファイルのみを抽出"""
-        return [file_path for file_path in file_paths 
-                if Path(file_path).suffix.lower() in ['.c', '.h']]
-    
-    # 全ファイルを取得
-    all_files = get_all_files()
-    
-    # .cと.hファイルのみを抽出
-    c_h_files = filter_c_h_files(all_files)
+    def _walk(root):
+        """ディレクトリ配下を再帰的に走査し、.cと.hファイルのパスを順に返す"""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                # DirEntryの種別情報を使い、エントリごとのstat呼び出しを避ける
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(('.c', '.h')):
+                    yield entry.path
+    
+    # 実行ファイルのフォルダ配下にある.cと.hファイルの相対パスを取得
+    script_dir = Path(__file__).parent
+    c_h_files = [Path(path).relative_to(script_dir) for path in _walk(script_dir)]
     
     print("=== C/Hファイル一覧 ===")
     for file_path in c_h_files:
@@ -260,8 +305,9 @@ if __name__ == "__main__":
     
     # 各ファイルからテーブル宣言を抽出
     print("\n=== テーブル抽出処理 ===")
-    for file_path in c_h_files:
-        extract_tables_from_file(file_path)
+    # ファイルごとに独立しているため、CPUコア数分のプロセスで並列に処理
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(extract_tables_from_file, c_h_files, chunksize=8))
     
     # テスト用のサンプルコード
     sample_code = '''
@@ -1,17 +1,39 @@
-import os
 import sys
+import functools
 import subprocess
 import importlib
+import importlib.util
+import importlib.metadata
 from pathlib import Path
 
+# バージョン仕様の解析に使う packaging は任意の依存ライブラリ
+try:
+    from packaging import version as packaging_version
+    from packaging.specifiers import SpecifierSet
+except ImportError:
+    packaging_version = None
+    SpecifierSet = None
+
+@functools.lru_cache(maxsize=None)
+def _parse_specifier(required_version):
+    """バージョン仕様を解析する（同じ仕様文字列の再解析を省くためキャッシュ）"""
+    return SpecifierSet(required_version)
+
+@functools.lru_cache(maxsize=None)
+def _parse_version(version_string):
+    """バージョン文字列を解析する（同じバージョンの再解析を省くためキャッシュ）"""
+    return packaging_version.parse(version_string)
+
 
 class DynamicLibraryManager:
     def __init__(self):
         # 実行ファイルのディレクトリを取得
         self.script_dir = Path(__file__).parent.absolute()
         self.py_lib_dir = self.script_dir / "py_Lib"
+        # 確認済みのモジュール（引数の組をキーにして同じライブラリの再確認を省く）
+        self._resolved = {}
     
-    def ensure_library(self, package_name, import_name=None, version=None, version_check=True):
+    def ensure_library(self, package_name, import_name=None, version=None, version_check=True, no_deps=False):
         """
         ライブラリの存在確認とインストールを行う
         
@@ -20,31 +42,121 @@ class DynamicLibraryManager:
             import_name (str): インポート時の名前（異なる場合のみ指定）
             version (str): 指定するバージョン（例: "1.2.3", ">=1.0.0", "~=2.1.0"）
             version_check (bool): 既存ライブラリのバージョン確認を行うか
+            no_deps (bool): 依存パッケージをインストールしない場合は True（pip の --no-deps）
         
         Returns:
             module: インポートされたモジュール
         """
+        # 同じ引数で確認済みの場合はキャッシュしたモジュールを返す
+        key = (package_name, import_name, version, version_check)
+        if key in self._resolved:
+            return self._resolved[key]
+        
         if import_name is None:
             import_name = package_name
         
         # パッケージ名にバージョン指定を追加
         package_spec = self._build_package_spec(package_name, version)
         
-        # 1. まず通常のインポートを試行
+        # 1. インストール済みのライブラリを確認してインポート
+        module = self._import_existing(package_name, import_name, version, version_check)
+        if module is not None:
+            self._resolved[key] = module
+            return module
+        
+        # 2. py_Libディレクトリを作成
+        self._ensure_lib_dir()
+        # 3. ローカルディレクトリにインストール
+        self._install_to_local_dir(package_spec, no_deps=no_deps)
+        
+        # 4. ローカルディレクトリをsys.pathに追加
+        self._add_to_path()
+        
+        # 5. 再度インポートを試行
+        module = self._import_installed(import_name)
+        self._resolved[key] = module
+        return module
+    
+    def ensure_libraries(self, specs, version_check=True, no_deps=False):
+        """
+        複数のライブラリの存在確認を行い、不足しているものを1回のpip実行でまとめてインストールする
+        
+        Args:
+            specs (list): (package_name, import_name, version) のタプルのリスト
+                          （import_name と version は ensure_library と同様に None を指定可能）
+            version_check (bool): 既存ライブラリのバージョン確認を行うか
+            no_deps (bool): 依存パッケージをインストールしない場合は True（pip の --no-deps）
+        
+        Returns:
+            dict: パッケージ名をキー、インポートされたモジュールを値とする辞書
+        """
+        modules = {}
+        missing = []
+        
+        # 1. インストール済みのライブラリを確認し、不足分を集める
+        for package_name, import_name, version in specs:
+            key = (package_name, import_name, version, version_check)
+            if key in self._resolved:
+                modules[package_name] = self._resolved[key]
+                continue
+            
+            if import_name is None:
+                import_name = package_name
+            
+            module = self._import_existing(package_name, import_name, version, version_check)
+            if module is None:
+                missing.append((key, package_name, import_name, version))
+            else:
+                self._resolved[key] = module
+                modules[package_name] = module
+        
+        if not missing:
+            return modules
+        
+        # 2. py_Libディレクトリを作成
+        self._ensure_lib_dir()
+        # 3. 不足分をまとめてローカルディレクトリにインストール
+        package_specs = [self._build_package_spec(package_name, version)
+                         for _, package_name, _, version in missing]
+        self._install_to_local_dir(*package_specs, no_deps=no_deps)
+        
+        # 4. ローカルディレクトリをsys.pathに追加
+        self._add_to_path()
+        
+        # 5. インストールしたライブラリをインポート
+        for key, package_name, import_name, _ in missing:
+            module = self._import_installed(import_name)
+            self._resolved[key] = module
+            modules[package_name] = module
+        
+        return modules
+    
+    def _import_existing(self, package_name, import_name, version, version_check):
+        """
+        インストール済みのライブラリを確認してインポートする
+        
+        モジュールを読み込まずに存在を確認し、バージョン適合後にのみインポートする。
+        
+        Returns:
+            module: インポートされたモジュール。存在しないかバージョンが要件を満たさない場合は None
+        """
         try:
-            module = importlib.import_module(import_name)
+            if self._find_spec(import_name) is None:
+                raise ImportError(f"{import_name} が見つかりません")
+            
+            # バージョンはパッケージのメタデータから取得（取得できない場合はインポート後に確認）
+            current_version = self._get_installed_version(package_name)
+            if current_version is not None:
+                self._verify_version(import_name, current_version, version, version_check)
             
-            # バージョンチェックが有効で、バージョンが指定されている場合
-            if version_check and version and hasattr(module, '__version__'):
-                if not self._check_version_compatibility(module.__version__, version):
-                    print(f"⚠ {import_name} のバージョンが要件を満たしません")
-                    print(f"  現在: {module.__version__}, 要求: {version}")
-                    print("  再インストールを実行します...")
-                    raise ImportError("バージョン不適合")
+            module = importlib.import_module(import_name)
+            if current_version is None and hasattr(module, '__version__'):
+                current_version = module.__version__
+                self._verify_version(import_name, current_version, version, version_check)
             
             print(f"✓ {import_name} は既にインストールされています")
-            if hasattr(module, '__version__'):
-                print(f"  バージョン: {module.__version__}")
+            if current_version is not None:
+                print(f"  バージョン: {current_version}")
             return module
             
         except ImportError:
@@ -52,17 +164,15 @@ class DynamicLibraryManager:
                 print(f"✗ {import_name} (バージョン: {version}) が見つかりません。インストールを開始します...")
             else:
                 print(f"✗ {import_name} が見つかりません。インストールを開始します...")
+            return None
+    
+    def _import_installed(self, import_name):
+        """
+        py_Libディレクトリへのインストール後にライブラリをインポートする
         
-        # 2. py_Libディレクトリを作成
-        if not os.path.exists(self.py_lib_dir): # ディレクトリが存在するか確認
-            os.makedirs(self.py_lib_dir) # ディレクトリ作成
-        # 3. ローカルディレクトリにインストール
-        self._install_to_local_dir(package_spec)
-        
-        # 4. ローカルディレクトリをsys.pathに追加
-        self._add_to_path()
-        
-        # 5. 再度インポートを試行
+        Raises:
+            ImportError: インポートできない場合
+        """
         try:
             module = importlib.import_module(import_name)
             print(f"✓ {import_name} のインストールとインポートが完了しました")
@@ -72,6 +182,51 @@ class DynamicLibraryManager:
         except ImportError as e:
             raise ImportError(f"ライブラリ {import_name} のインストールに失敗しました: {e}")
     
+    def _find_spec(self, import_name):
+        """
+        モジュールをインポートせずにその仕様を検索する
+        
+        Args:
+            import_name (str): インポート時の名前
+        
+        Returns:
+            ModuleSpec: 見つからない場合は None
+        """
+        try:
+            return importlib.util.find_spec(import_name)
+        except (ImportError, ValueError):
+            # 親パッケージが存在しない場合など
+            return None
+    
+    def _get_installed_version(self, package_name):
+        """
+        インストール済みパッケージのバージョンをメタデータから取得（モジュールはインポートしない）
+        
+        Args:
+            package_name (str): パッケージ名
+        
+        Returns:
+            str: バージョン文字列。メタデータがない場合は None
+        """
+        try:
+            return importlib.metadata.version(package_name)
+        except importlib.metadata.PackageNotFoundError:
+            return None
+    
+    def _verify_version(self, import_name, current_version, version, version_check):
+        """
+        バージョンチェックが有効で、バージョンが指定されている場合に要件を満たすか確認
+        
+        Raises:
+            ImportError: バージョンが要件を満たさない場合
+        """
+        if version_check and version:
+            if not self._check_version_compatibility(current_version, version):
+                print(f"⚠ {import_name} のバージョンが要件を満たしません")
+                print(f"  現在: {current_version}, 要求: {version}")
+                print("  再インストールを実行します...")
+                raise ImportError("バージョン不適合")
+    
     def _build_package_spec(self, package_name, version):
         """
         パッケージ名とバージョンから pip install 用の仕様文字列を構築
@@ -105,17 +260,7 @@ class DynamicLibraryManager:
         Returns:
             bool: 互換性があるかどうか
         """
-        try:
-            from packaging import version
-            from packaging.specifiers import SpecifierSet
-            
-            # バージョン仕様を解析
-            spec_set = SpecifierSet(required_version)
-            current_ver = version.parse(current_version)
-            
-            return current_ver in spec_set
-            
-        except ImportError:
+        if SpecifierSet is None:
             # packagingライブラリがない場合は簡単な文字列比較
             print("⚠ packaging ライブラリがないため、簡易バージョンチェックを実行")
             if required_version.startswith('=='):
@@ -125,36 +270,44 @@ class DynamicLibraryManager:
             else:
                 print(f"⚠ バージョン仕様 '{required_version}' を解析できません")
                 return True  # 不明な場合は通す
+        
+        try:
+            # 解析済みのバージョン仕様とバージョンで比較
+            return _parse_version(current_version) in _parse_specifier(required_version)
+            
         except Exception as e:
             print(f"⚠ バージョンチェックでエラー: {e}")
             return True  # エラー時は通す
+    
+    def _ensure_lib_dir(self):
         """py_Libディレクトリを作成"""
         if not self.py_lib_dir.exists():
             self.py_lib_dir.mkdir(parents=True, exist_ok=True)
             print(f"✓ ディレクトリを作成しました: {self.py_lib_dir}")
     
-    def _install_to_local_dir(self, package_spec):
-        """指定されたディレクトリにpipインストールを実行"""
+    def _install_to_local_dir(self, *package_specs, no_deps=False):
+        """指定されたディレクトリにpipインストールを実行（複数指定時は1回のpip実行でまとめて処理）"""
         try:
+            # pip自身の更新確認（ネットワークアクセス）と対話入力を行わない
             cmd = [
                 sys.executable, "-m", "pip", "install",
                 "--target", str(self.py_lib_dir),
-                package_spec
+                "--disable-pip-version-check",
+                "--no-input",
             ]
+            if no_deps:
+                cmd.append("--no-deps")
+            cmd.extend(package_specs)
             
-            print(f"インストール実行中: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            print(f"✓ {package_spec} のインストールが完了しました")
-            
-            # インストール結果の詳細を表示（オプション）
-            if result.stdout:
-                print("インストール詳細:")
-                print(result.stdout)
+            # pipの出力より前に表示されるようフラッシュしておく
+            print(f"インストール実行中: {' '.join(cmd)}", flush=True)
+            # pipの出力はメモリに溜めず、そのまま標準出力・標準エラーに流す
+            subprocess.run(cmd, check=True)
+            print(f"✓ {' '.join(package_specs)} のインストールが完了しました")
             
         except subprocess.CalledProcessError as e:
+            # エラー詳細はpip自身が標準エラーに出力済み
             print(f"✗ インストールエラー: {e}")
-            if e.stderr:
-                print(f"エラー詳細: {e.stderr}")
             raise
     
     def _add_to_path(self):
@@ -176,7 +329,7 @@ class DynamicLibraryManager:
                 print(f"📁 {item.name}")
         print("=" * 50)
 # より簡単な関数インターフェース
-def ensure_library(package_name, import_name=None, version=None, version_check=True):
+def ensure_library(package_name, import_name=None, version=None, version_check=True, no_deps=False):
     """
     グローバルなライブラリマネージャーを使用した簡単なインターフェース
     
@@ -185,6 +338,7 @@ def ensure_library(package_name, import_name=None, version=None, version_check=T
         import_name (str): インポート時の名前（異なる場合のみ指定）
         version (str): 指定するバージョン（例: "1.2.3", ">=1.0.0", "~=2.1.0"）
         version_check (bool): 既存ライブラリのバージョン確認を行うか
+        no_deps (bool): 依存パッケージをインストールしない場合は True（pip の --no-deps）
     
     Returns:
         module: インポートされたモジュール
@@ -192,7 +346,24 @@ def ensure_library(package_name, import_name=None, version=None, version_check=T
     if not hasattr(ensure_library, '_manager'):
         ensure_library._manager = DynamicLibraryManager()
     
-    return ensure_library._manager.ensure_library(package_name, import_name, version, version_check)
+    return ensure_library._manager.ensure_library(package_name, import_name, version, version_check, no_deps)
+
+def ensure_libraries(specs, version_check=True, no_deps=False):
+    """
+    グローバルなライブラリマネージャーを使用して複数のライブラリをまとめて確認・インストールする
+    
+    Args:
+        specs (list): (package_name, import_name, version) のタプルのリスト
+        version_check (bool): 既存ライブラリのバージョン確認を行うか
+        no_deps (bool): 依存パッケージをインストールしない場合は True（pip の --no-deps）
+    
+    Returns:
+        dict: パッケージ名をキー、インポートされたモジュールを値とする辞書
+    """
+    if not hasattr(ensure_library, '_manager'):
+        ensure_library._manager = DynamicLibraryManager()
+    
+    return ensure_library._manager.ensure_libraries(specs, version_check, no_deps)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+import os
+import re
+
+# RE2（Google製の線形時間正規表現エンジン）は任意の依存ライブラリ
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# 環境変数 C_REGEX_ENGINE=re2 が指定され、かつ re2 がインストールされている場合のみ使用
+USE_RE2 = re2 is not None and os.environ.get('C_REGEX_ENGINE', '').strip().lower() == 're2'
+
+# RE2 でインラインフラグとして指定できるフラグ
+_INLINE_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+
+def compile_regex(pattern, flags=0):
+    """
+    正規表現をコンパイルする（RE2が有効な場合はRE2を優先して使用）
+    
+    RE2 が無効な場合や、RE2 で扱えないパターン（先読み・後方参照など）や
+    フラグの場合は標準の re でコンパイルする。
+    なお RE2 の \\s や \\w は ASCII 文字のみに一致する点が re と異なる。
+    
+    Args:
+        pattern: 正規表現パターン文字列
+        flags: re モジュールのフラグ (re.DOTALL, re.MULTILINE, re.VERBOSE など)
+    
+    Returns:
+        コンパイル済みの正規表現オブジェクト
+    """
+    if USE_RE2:
+        re2_pattern = pattern
+        if flags & re.VERBOSE:
+            # RE2 は (?x) に対応しないため、空白とコメントを除去した形に変換
+            re2_pattern = _strip_verbose(pattern)
+        
+        if not flags & ~(re.VERBOSE | re.IGNORECASE | re.MULTILINE | re.DOTALL):
+            inline = ''.join(flag_char for flag, flag_char in _INLINE_FLAGS if flags & flag)
+            if inline:
+                re2_pattern = f'(?{inline})' + re2_pattern
+            try:
+                return re2.compile(re2_pattern)
+            except Exception:
+                pass  # RE2 で扱えないパターンは re にフォールバック
+    
+    return re.compile(pattern, flags)
+
+def _strip_verbose(pattern):
+    """
+    VERBOSE 形式のパターンから空白と # コメントを除去する
+    （エスケープされた文字と文字クラス内の文字はそのまま残す）
+    """
+    result = []
+    in_class = False
+    i = 0
+    length = len(pattern)
+    
+    while i < length:
+        char = pattern[i]
+        if char == '\\':
+            result.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+            result.append(char)
+        elif char == '[':
+            in_class = True
+            result.append(char)
+            # 先頭の ']' や '^]' はクラスの終わりではない
+            if pattern.startswith('^]', i + 1):
+                result.append('^]')
+                i += 2
+            elif pattern.startswith(']', i + 1):
+                result.append(']')
+                i += 1
+        elif char == '#':
+            # 行末までのコメントを読み飛ばす
+            newline = pattern.find('\n', i)
+            i = length if newline == -1 else newline
+            continue
+        elif not char.isspace():
+            result.append(char)
+        i += 1
+    
+    return ''.join(result)